@@ -41,8 +41,39 @@ async def startup_event():
     else:
         print("❌ Redis: Not connected (using in-memory rate limiting)")
     
+    # Start the TTS engine so the voice model is loaded before the first reply
+    from src.utils.piper_service import piper_tts_service
+    from src.utils.gemini_service import FALLBACK_REPLY, UNAVAILABLE_REPLY
+    # Canned replies may be overridden through the environment; bank whatever is configured
+    piper_tts_service.register_phrases([FALLBACK_REPLY, UNAVAILABLE_REPLY])
+    try:
+        await piper_tts_service.startup()
+        print(f"✅ TTS: {piper_tts_service.backend} backend ready")
+    except Exception as e:
+        print(f"❌ TTS: {piper_tts_service.backend} backend failed to start ({e}), will retry on first request")
+    
+    from src.utils.gemini_service import gemini_service
+    await gemini_service.startup()
+    
+    # Open the pooled AssemblyAI client once instead of per request
+    from src.utils import stt_service
+    await stt_service.startup()
+    
     print("✅ Server startup complete!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release long-lived resources on shutdown"""
+    from src.utils.piper_service import piper_tts_service
+    from src.utils.gemini_service import gemini_service
+    from src.utils.conversation_memory import conversation_memory
+    from src.utils import stt_service
+    
+    await piper_tts_service.shutdown()
+    await conversation_memory.close()
+    await gemini_service.close()
+    await stt_service.shutdown()
+
 # Add security middleware
 app.add_middleware(RequestIDMiddleware)
 
@@ -100,6 +131,13 @@ async def health_check():
     
     return health_status
 
+@app.get("/metrics")
+async def get_metrics():
+    """Snapshot of in-process service metrics (counters and histograms)."""
+    from src.utils.metrics import metrics
+    
+    return metrics.snapshot()
+
 @app.get("/security-test")
 @limiter.limit("2/minute")
 async def security_test(request: Request):
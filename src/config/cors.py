@@ -28,9 +28,24 @@ class CORSConfig:
             "X-Requested-With",
             "Accept",
             "Origin",
-            "X-CSRF-Token"
+            "X-CSRF-Token",
+            # Conditional and partial downloads of voice files
+            "Range",
+            "If-Range",
+            "If-None-Match"
+        ])
+        # Binary audio responses carry the reply text in these headers; voice
+        # file downloads need the caching and range headers for resumable playback
+        self.exposed_headers = self._parse_list("CORS_EXPOSED_HEADERS", [
+            "X-Jessy-Message",
+            "X-Jessy-Transcribed-Text",
+            "X-Jessy-AI-Response",
+            "X-Jessy-Voice-Filename",
+            "ETag",
+            "Content-Range",
+            "Accept-Ranges",
+            "Content-Length"
         ])
-        self.exposed_headers = self._parse_list("CORS_EXPOSED_HEADERS", [])
         self.max_age = int(os.getenv("CORS_MAX_AGE", "86400"))  # 24 hours
     
     def _parse_allowed_origins(self) -> List[str]:
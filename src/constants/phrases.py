@@ -0,0 +1,31 @@
+# Recurring replies that are pre-synthesized at startup and served from memory.
+# Override or extend with a JSON list of strings via PHRASE_BANK_FILE. The
+# canned Gemini fallback and unavailable replies are registered at startup.
+phrase_bank = [
+    # Greetings
+    "¡Hola! ¿Cómo estás hoy?",
+    "¡Buenos días! ¿Cómo amaneciste?",
+    "¡Buenas tardes! ¿Cómo va tu día?",
+    "¡Buenas noches! ¿Cómo te fue hoy?",
+    "Hello! How are you feeling today?",
+    "Good morning! How did you sleep?",
+    "¡Claro que sí!",
+    "¡Con mucho gusto!",
+    "De nada, para eso estoy.",
+    "You're welcome, I'm always here for you.",
+
+    # Clarifying questions
+    "Perdón, no te entendí bien. ¿Me lo puedes repetir?",
+    "¿Me puedes contar un poquito más?",
+    "Sorry, I didn't quite catch that. Could you say it again?",
+    "Could you tell me a little more?",
+
+    # Graceful fallbacks
+    "Lo siento, ahorita no puedo responder. ¿Lo intentamos de nuevo en un momento?",
+
+    # Emergency acknowledgements
+    "Estoy aquí contigo. Si te lastimaste, llama a tu cuidador o al 911.",
+    "Tranquilo, estoy contigo. ¿Puedes llamar a alguien para que te ayude?",
+    "I'm right here with you. If you're hurt, please call your caregiver or 911.",
+    "Stay calm, I'm with you. Can you reach someone to help you?"
+]
@@ -1,13 +1,45 @@
-from fastapi import HTTPException
+import asyncio
+import json
+import os
+import time
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from typing import Optional
-from src.utils.gemini_service import gemini_service
+from typing import AsyncIterator, List, Optional, Union
+from src.utils.audio_response import (
+    RESPONSE_MODES,
+    build_audio_response,
+    build_multipart_response
+)
+from src.utils.conversation_memory import conversation_memory, require_session
+from src.utils.metrics import metrics
+from src.utils.gemini_service import (
+    FALLBACK_REPLY,
+    UNAVAILABLE_REPLY,
+    LLMError,
+    LLMOverloadedError,
+    LLMTimeoutError,
+    LLMUnavailableError,
+    gemini_service
+)
 from src.utils.piper_service import piper_tts_service
+from src.utils.response_budget import max_tokens_for, truncate_to_sentence
+from src.utils.sse import sse_event
+from src.utils.text_segmentation import split_sentences
+from src.utils.voice_pipeline import generate_spoken_reply
 
 class ChatRequest(BaseModel):
     message: str
     include_voice: bool = True
     voice_format: str = "wav"
+    # "json" embeds base64 audio, "audio" and "multipart" send it as binary
+    response_mode: str = "json"
+    # Personalized turns skip the shared LLM reply cache
+    bypass_cache: bool = False
+    # Turns with the same session_id share conversation memory
+    session_id: Optional[str] = None
+    # Output token cap; defaults to the voice or text budget
+    max_tokens: Optional[int] = None
 
 class ChatResponse(BaseModel):
     message: str
@@ -20,14 +52,67 @@ class ChatResponse(BaseModel):
     success: bool = True
     error: Optional[str] = None
 
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest]
+    # Items processed at once; defaults to (and is capped at) CHAT_BATCH_CONCURRENCY
+    concurrency: Optional[int] = None
+
+# Batches share the Gemini and Piper slots with interactive chat; keeping their
+# fan-out below GEMINI_MAX_CONCURRENCY leaves room for live users
+BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+
+batch_items = metrics.counter("chat_batch_items", "Batch chat items processed")
+batch_item_failures = metrics.counter("chat_batch_item_failures", "Batch chat items that failed")
+
+def ndjson_line(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+def llm_http_error(error: LLMError) -> HTTPException:
+    if isinstance(error, LLMTimeoutError):
+        status_code = 504
+    elif isinstance(error, LLMOverloadedError):
+        status_code = 503
+    else:
+        status_code = 502
+    return HTTPException(status_code=status_code, detail=f"Failed to generate AI response: {str(error)}")
+
 class AIChatController:
-    async def chat_with_ai(self, request: ChatRequest) -> ChatResponse:
+    @staticmethod
+    def _context(request: ChatRequest) -> str:
+        return conversation_memory.context(request.session_id) if request.session_id else ""
+    
+    @staticmethod
+    def _remember(request: ChatRequest, ai_response: str):
+        if request.session_id and ai_response not in (FALLBACK_REPLY, UNAVAILABLE_REPLY):
+            conversation_memory.add_turn(request.session_id, request.message, ai_response)
+    
+    async def _reply_text(self, request: ChatRequest, voice: bool) -> str:
         try:
+            return await gemini_service.generate_text(
+                request.message,
+                max_tokens=max_tokens_for(voice, request.max_tokens),
+                use_cache=not request.bypass_cache,
+                context=self._context(request)
+            )
+        except LLMUnavailableError:
+            # Fail fast instead of queueing on a backend that is down
+            return UNAVAILABLE_REPLY
+    
+    async def chat_with_ai(self, request: ChatRequest) -> Union[ChatResponse, Response]:
+        try:
+            if request.response_mode not in RESPONSE_MODES:
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Unsupported response mode. Supported: {RESPONSE_MODES}"
+                )
+            
             if not gemini_service.is_configured():
                 raise HTTPException(
                     status_code=500, 
                     detail="Gemini AI service is not properly configured"
                 )
+            require_session(request.session_id)
             
             if request.include_voice and not piper_tts_service.is_configured():
                 raise HTTPException(
@@ -35,19 +120,14 @@ class AIChatController:
                     detail="Piper TTS service is not properly configured"
                 )
             
-            ai_response = await gemini_service.generate_text(request.message)
-            
-            if not ai_response or ai_response.startswith("Error:"):
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Failed to generate AI response: {ai_response}"
-                )
-            
             voice_data = None
             voice_format = None
             voice_filename = None
             voice_file_path = None
             voice_file_size = None
+            voice_bytes = None
+            voice_result = None
+            binary_delivery = request.response_mode != "json"
             
             if request.include_voice:
                 supported_formats = piper_tts_service.get_supported_formats()
@@ -57,21 +137,37 @@ class AIChatController:
                         detail=f"Unsupported voice format. Supported: {supported_formats}"
                     )
                 
-                voice_result = await piper_tts_service.text_to_speech(
-                    ai_response, 
-                    request.voice_format
-                )
-                
-                if voice_result:
-                    voice_data = voice_result["audio_base64"]
-                    voice_format = request.voice_format
-                    voice_filename = voice_result["filename"]
-                    voice_file_path = voice_result["file_path"]
-                    voice_file_size = voice_result["file_size"]
-                else:
-                    print("Warning: Voice synthesis failed, returning text only")
+                # Sentences are synthesized while the rest of the reply is generated
+                try:
+                    ai_response, voice_result = await generate_spoken_reply(
+                        request.message,
+                        request.voice_format,
+                        encode_base64=not binary_delivery,
+                        use_cache=not request.bypass_cache,
+                        context=self._context(request),
+                        max_tokens=max_tokens_for(True, request.max_tokens)
+                    )
+                except LLMError as e:
+                    raise llm_http_error(e)
+            else:
+                try:
+                    ai_response = await self._reply_text(request, voice=False)
+                except LLMError as e:
+                    raise llm_http_error(e)
             
-            return ChatResponse(
+            self._remember(request, ai_response)
+            
+            if voice_result:
+                voice_data = voice_result["audio_base64"]
+                voice_bytes = voice_result["audio_bytes"]
+                voice_format = request.voice_format
+                voice_filename = voice_result["filename"]
+                voice_file_path = voice_result["file_path"]
+                voice_file_size = voice_result["file_size"]
+            elif request.include_voice:
+                print("Warning: Voice synthesis failed, returning text only")
+            
+            response = ChatResponse(
                 message=request.message,
                 ai_response=ai_response,
                 voice_data=voice_data,
@@ -82,6 +178,15 @@ class AIChatController:
                 success=True
             )
             
+            # Without audio there is nothing to send as binary; fall back to JSON
+            if not binary_delivery or voice_bytes is None:
+                return response
+            
+            metadata = jsonable_encoder(response, exclude={"voice_data"})
+            if request.response_mode == "audio":
+                return build_audio_response(voice_bytes, voice_format, metadata)
+            return build_multipart_response(metadata, voice_bytes, voice_format)
+            
         except HTTPException:
             raise
         except Exception as e:
@@ -93,11 +198,218 @@ class AIChatController:
                 error=f"Internal server error: {str(e)}"
             )
     
+    def validate_text_request(self, request: ChatRequest):
+        if not gemini_service.is_configured():
+            raise HTTPException(
+                status_code=500, 
+                detail="Gemini AI service is not properly configured"
+            )
+        require_session(request.session_id)
+    
+    async def stream_chat(self, request: ChatRequest) -> AsyncIterator[str]:
+        """Yield SSE "token" events as Gemini streams the reply, then a "done" event."""
+        started = time.monotonic()
+        first_token_ms = None
+        parts = []
+        usage = {}
+        try:
+            async for text in gemini_service.stream_text(
+                request.message,
+                max_tokens=max_tokens_for(False, request.max_tokens),
+                usage=usage,
+                use_cache=not request.bypass_cache,
+                context=self._context(request)
+            ):
+                if first_token_ms is None:
+                    first_token_ms = round((time.monotonic() - started) * 1000, 1)
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except LLMUnavailableError:
+            parts = [UNAVAILABLE_REPLY]
+            yield sse_event("token", {"text": UNAVAILABLE_REPLY})
+        except Exception as e:
+            print(f"Error in stream_chat: {str(e)}")
+            yield sse_event("error", {"error": f"Failed to generate AI response: {str(e) or type(e).__name__}"})
+            return
+        
+        ai_response = "".join(parts).strip()
+        if usage.get("truncated"):
+            ai_response = truncate_to_sentence(ai_response)
+        if ai_response:
+            self._remember(request, ai_response)
+        yield sse_event("done", {
+            "message": request.message,
+            "ai_response": ai_response,
+            "usage": usage,
+            "timing": {
+                "first_token_ms": first_token_ms,
+                "total_ms": round((time.monotonic() - started) * 1000, 1)
+            },
+            "success": True
+        })
+    
+    def validate_voice_request(self, request: ChatRequest):
+        self.validate_text_request(request)
+        
+        if not piper_tts_service.is_configured():
+            raise HTTPException(
+                status_code=500, 
+                detail="Piper TTS service is not properly configured"
+            )
+        
+        supported_formats = piper_tts_service.get_supported_formats()
+        if request.voice_format not in supported_formats:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Unsupported voice format. Supported: {supported_formats}"
+            )
+    
+    async def stream_chat_with_voice(self, request: ChatRequest) -> AsyncIterator[str]:
+        """
+        Yield SSE events for a voice reply, one audio event per sentence.
+        The next sentence is synthesized while the current one is being sent.
+        """
+        try:
+            ai_response = await self._reply_text(request, voice=True)
+        except LLMError as e:
+            yield sse_event("error", {"error": f"Failed to generate AI response: {str(e)}"})
+            return
+        self._remember(request, ai_response)
+        
+        yield sse_event("text", {"message": request.message, "ai_response": ai_response})
+        
+        sentences = split_sentences(ai_response)
+        pending = None
+        try:
+            for index, sentence in enumerate(sentences):
+                if pending is None:
+                    pending = asyncio.create_task(
+                        piper_tts_service.text_to_speech(sentence, request.voice_format)
+                    )
+                voice_result = await pending
+                pending = None
+                
+                if index + 1 < len(sentences):
+                    pending = asyncio.create_task(
+                        piper_tts_service.text_to_speech(sentences[index + 1], request.voice_format)
+                    )
+                
+                if not voice_result:
+                    yield sse_event("audio_error", {"index": index, "text": sentence})
+                    continue
+                
+                yield sse_event("audio", {
+                    "index": index,
+                    "text": sentence,
+                    "voice_data": voice_result["audio_base64"],
+                    "voice_format": request.voice_format,
+                    "voice_filename": voice_result["filename"],
+                    "voice_file_size": voice_result["file_size"]
+                })
+        finally:
+            # The client went away mid-stream; don't keep synthesizing for it
+            if pending is not None and not pending.done():
+                pending.cancel()
+        
+        yield sse_event("done", {"sentences": len(sentences), "success": True})
+    
+    def validate_batch_request(self, batch: BatchChatRequest):
+        if not batch.items:
+            raise HTTPException(status_code=400, detail="Batch has no items")
+        if len(batch.items) > BATCH_MAX_ITEMS:
+            raise HTTPException(
+                status_code=413, 
+                detail=f"Batch too large. Maximum items: {BATCH_MAX_ITEMS}"
+            )
+        if batch.concurrency is not None and batch.concurrency < 1:
+            raise HTTPException(status_code=400, detail="concurrency must be at least 1")
+        # Audio travels base64-encoded inside each NDJSON line
+        if any(item.response_mode != "json" for item in batch.items):
+            raise HTTPException(status_code=400, detail="Batch items only support response_mode 'json'")
+        
+        # Fail the whole batch up front rather than every item one by one
+        for item in batch.items:
+            if item.include_voice:
+                self.validate_voice_request(item)
+            else:
+                self.validate_text_request(item)
+    
+    async def _batch_item(self, index: int, request: ChatRequest) -> dict:
+        started = time.monotonic()
+        try:
+            response = await self.chat_with_ai(request)
+            result = {"index": index, **jsonable_encoder(response)}
+        except HTTPException as e:
+            result = {
+                "index": index,
+                "message": request.message,
+                "success": False,
+                "status_code": e.status_code,
+                "error": e.detail
+            }
+        except Exception as e:
+            result = {"index": index, "message": request.message, "success": False, "error": str(e)}
+        
+        batch_items.inc()
+        if not result["success"]:
+            batch_item_failures.inc()
+        result["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return result
+    
+    async def stream_batch(self, batch: BatchChatRequest) -> AsyncIterator[str]:
+        """
+        Yield one NDJSON line per item in completion order, then a summary line.
+        A fixed pool of workers bounds how many items run at once.
+        """
+        started = time.monotonic()
+        concurrency = min(batch.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY, len(batch.items))
+        pending = iter(enumerate(batch.items))
+        results: asyncio.Queue = asyncio.Queue()
+        
+        async def worker():
+            # Workers share one iterator, so each item is taken exactly once
+            for index, request in pending:
+                results.put_nowait(await self._batch_item(index, request))
+        
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        succeeded = 0
+        try:
+            for _ in range(len(batch.items)):
+                result = await results.get()
+                succeeded += result["success"]
+                yield ndjson_line(result)
+        finally:
+            # The client went away mid-batch; don't keep generating for it
+            for task in workers:
+                task.cancel()
+        
+        yield ndjson_line({
+            "done": True,
+            "items": len(batch.items),
+            "succeeded": succeeded,
+            "failed": len(batch.items) - succeeded,
+            "concurrency": concurrency,
+            "total_ms": round((time.monotonic() - started) * 1000, 1)
+        })
+    
     async def health_check(self) -> dict:
         return {
             "gemini_configured": gemini_service.is_configured(),
+            "gemini": gemini_service.get_stats(),
             "piper_configured": piper_tts_service.is_configured(),
-            "supported_voice_formats": piper_tts_service.get_supported_formats()
+            "supported_voice_formats": piper_tts_service.get_supported_formats(),
+            "tts_engine": piper_tts_service.get_engine_stats(),
+            "tts_cache": piper_tts_service.get_cache_stats(),
+            "voice_files": piper_tts_service.voice_store.get_stats(),
+            "phrase_bank": piper_tts_service.get_phrase_bank_stats(),
+            "conversations": conversation_memory.get_stats()
         }
+    
+    def create_session(self) -> dict:
+        return {"session_id": conversation_memory.create_session()}
+    
+    def clear_session(self, session_id: str):
+        if not conversation_memory.clear(session_id):
+            raise HTTPException(status_code=404, detail="Session not found")
 
 ai_chat_controller = AIChatController()
\ No newline at end of file
@@ -3,15 +3,35 @@ Responsible for the whole speech to speech process
 
 '''
 
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncIterable, Optional, Union
+from src.controllers.ai_chat_controller import llm_http_error
 from src.utils import stt_service
-from src.utils.gemini_service import gemini_service
-from src.utils.piper_service import piper_tts_service
+from src.utils.audio_response import build_audio_response, build_multipart_response
+from src.utils.conversation_memory import conversation_memory
+from src.utils.gemini_service import (
+    FALLBACK_REPLY,
+    UNAVAILABLE_REPLY,
+    LLMError,
+    LLMUnavailableError,
+    gemini_service
+)
+from src.utils.response_budget import max_tokens_for
+from src.utils.voice_pipeline import generate_spoken_reply
 
 class VoiceChatRequest(BaseModel):
     include_voice_response: bool = True
     voice_format: str = "wav"
+    # "json" embeds base64 audio, "audio" and "multipart" send it as binary
+    response_mode: str = "json"
+    # Personalized turns skip the shared LLM reply cache
+    bypass_cache: bool = False
+    # Turns with the same session_id share conversation memory
+    session_id: Optional[str] = None
+    # Output token cap; defaults to the voice or text budget
+    max_tokens: Optional[int] = None
 
 class VoiceChatResponse(BaseModel):
     transcribed_text: str
@@ -22,7 +42,7 @@ class VoiceChatResponse(BaseModel):
     success: bool = True
     error: Optional[str] = None
 
-async def process_voice_chat(audio_data: bytes, request: VoiceChatRequest) -> VoiceChatResponse:
+async def process_voice_chat(audio_data: Union[bytes, AsyncIterable[bytes]], request: VoiceChatRequest) -> Union[VoiceChatResponse, Response]:
     try:
         # Step 1: Transcribe audio
         transcribed_text = await stt_service.transcribe_audio(audio_data)
@@ -34,32 +54,58 @@ async def process_voice_chat(audio_data: bytes, request: VoiceChatRequest) -> Vo
                 error="Failed to transcribe audio"
             )
         
-        # Step 2: Generate AI response
-        ai_response = await gemini_service.generate_text(transcribed_text)
-        if not ai_response or ai_response.startswith("Error:"):
+        # Step 2: Generate AI response, synthesizing each sentence as it
+        # arrives when a voice response is wanted (steps 2 and 3 overlap)
+        voice_data = None
+        voice_format = None
+        voice_filename = None
+        voice_bytes = None
+        voice_result = None
+        binary_delivery = request.response_mode != "json"
+        
+        context = conversation_memory.context(request.session_id) if request.session_id else ""
+        try:
+            if request.include_voice_response:
+                ai_response, voice_result = await generate_spoken_reply(
+                    transcribed_text,
+                    request.voice_format,
+                    encode_base64=not binary_delivery,
+                    use_cache=not request.bypass_cache,
+                    context=context,
+                    max_tokens=max_tokens_for(True, request.max_tokens)
+                )
+            else:
+                try:
+                    ai_response = await gemini_service.generate_text(
+                        transcribed_text,
+                        max_tokens=max_tokens_for(False, request.max_tokens),
+                        use_cache=not request.bypass_cache,
+                        context=context
+                    )
+                except LLMUnavailableError:
+                    ai_response = UNAVAILABLE_REPLY
+        except LLMError as e:
+            # Same statuses as the chat routes: 504 on timeout, 503 when overloaded
+            raise llm_http_error(e)
+        
+        if not ai_response:
             return VoiceChatResponse(
                 transcribed_text=transcribed_text,
                 ai_response="",
                 success=False,
                 error="Failed to generate AI response"
             )
+        if request.session_id and ai_response not in (FALLBACK_REPLY, UNAVAILABLE_REPLY):
+            conversation_memory.add_turn(request.session_id, transcribed_text, ai_response)
         
-        # Step 3: Generate voice response (optional)
-        voice_data = None
-        voice_format = None
-        voice_filename = None
-        
-        if request.include_voice_response:
-            voice_result = await piper_tts_service.text_to_speech(
-                ai_response, 
-                request.voice_format
-            )
-            if voice_result:
-                voice_data = voice_result["audio_base64"]
-                voice_format = request.voice_format
-                voice_filename = voice_result["filename"]
+        # Step 3: Voice response (optional)
+        if voice_result:
+            voice_data = voice_result["audio_base64"]
+            voice_bytes = voice_result["audio_bytes"]
+            voice_format = request.voice_format
+            voice_filename = voice_result["filename"]
         
-        return VoiceChatResponse(
+        response = VoiceChatResponse(
             transcribed_text=transcribed_text,
             ai_response=ai_response,
             voice_data=voice_data,
@@ -68,6 +114,17 @@ async def process_voice_chat(audio_data: bytes, request: VoiceChatRequest) -> Vo
             success=True
         )
         
+        # Without audio there is nothing to send as binary; fall back to JSON
+        if not binary_delivery or voice_bytes is None:
+            return response
+        
+        metadata = jsonable_encoder(response, exclude={"voice_data"})
+        if request.response_mode == "audio":
+            return build_audio_response(voice_bytes, voice_format, metadata)
+        return build_multipart_response(metadata, voice_bytes, voice_format)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         return VoiceChatResponse(
             transcribed_text="",
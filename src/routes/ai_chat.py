@@ -1,23 +1,59 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
 from src.controllers.ai_chat_controller import (
     ai_chat_controller, 
+    BatchChatRequest,
     ChatRequest, 
     ChatResponse
 )
 from src.utils.piper_service import piper_tts_service
+from src.utils.sse import SSE_HEADERS
+from src.utils.audio_response import audio_media_type, build_file_response
+from src.utils.disconnect import cancel_on_disconnect
 
 router = APIRouter()
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, http_request: Request):
     try:
-        response = await ai_chat_controller.chat_with_ai(request)
+        response = await cancel_on_disconnect(http_request, ai_chat_controller.chat_with_ai(request))
         return response
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream the reply text as Server-Sent Events while Gemini generates it."""
+    ai_chat_controller.validate_text_request(request)
+    return StreamingResponse(
+        ai_chat_controller.stream_chat(request),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.post("/chat/voice-stream")
+async def chat_with_voice_stream(request: ChatRequest):
+    """Stream the reply as Server-Sent Events, one audio chunk per sentence."""
+    ai_chat_controller.validate_voice_request(request)
+    return StreamingResponse(
+        ai_chat_controller.stream_chat_with_voice(request),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.post("/chat/batch")
+async def chat_batch(batch: BatchChatRequest):
+    """Run many chat requests with bounded parallelism; results stream back as NDJSON in completion order."""
+    ai_chat_controller.validate_batch_request(batch)
+    return StreamingResponse(
+        ai_chat_controller.stream_batch(batch),
+        media_type="application/x-ndjson",
+        headers=SSE_HEADERS
+    )
+
 @router.get("/chat/health")
 async def get_ai_health():
     try:
@@ -26,13 +62,26 @@ async def get_ai_health():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/chat/sessions")
+async def create_chat_session():
+    """Start a conversation; pass the returned session_id on later turns."""
+    return ai_chat_controller.create_session()
+
+@router.delete("/chat/sessions/{session_id}")
+async def clear_chat_session(session_id: str):
+    """Forget a conversation's history and summary."""
+    ai_chat_controller.clear_session(session_id)
+    return {"success": True}
+
 @router.post("/chat/text-only", response_model=ChatResponse)
 async def chat_text_only(
-    message: str = Query(..., description="Text message to send to AI")
+    http_request: Request,
+    message: str = Query(..., description="Text message to send to AI"),
+    session_id: Optional[str] = Query(None, description="Conversation session for multi-turn memory")
 ):
     try:
-        request = ChatRequest(message=message, include_voice=False)
-        response = await ai_chat_controller.chat_with_ai(request)
+        request = ChatRequest(message=message, include_voice=False, session_id=session_id)
+        response = await cancel_on_disconnect(http_request, ai_chat_controller.chat_with_ai(request))
         return response
     except HTTPException:
         raise
@@ -41,16 +90,21 @@ async def chat_text_only(
 
 @router.get("/chat/voice-simple")
 async def chat_with_voice_simple(
+    http_request: Request,
     message: str = Query(..., description="Text message to send to AI"),
-    voice_format: str = Query("wav", description="Audio format: wav, mp3, flac")
+    voice_format: str = Query("wav", description="Audio format: wav, opus, mp3, flac"),
+    response_mode: str = Query("json", description="Response mode: json (base64 audio), audio (raw audio, text in headers), multipart"),
+    session_id: Optional[str] = Query(None, description="Conversation session for multi-turn memory")
 ):
     try:
         request = ChatRequest(
             message=message, 
             include_voice=True, 
-            voice_format=voice_format
+            voice_format=voice_format,
+            response_mode=response_mode,
+            session_id=session_id
         )
-        response = await ai_chat_controller.chat_with_ai(request)
+        response = await cancel_on_disconnect(http_request, ai_chat_controller.chat_with_ai(request))
         return response
     except HTTPException:
         raise
@@ -58,12 +112,42 @@ async def chat_with_voice_simple(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/voice/files")
-async def list_voice_files():
+async def list_voice_files(
+    limit: int = Query(50, ge=1, le=500, description="Files per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
     try:
-        voice_files = piper_tts_service.get_voice_files()
-        return {
-            "voice_files": voice_files,
-            "total_files": len(voice_files)
-        }
+        return piper_tts_service.get_voice_files(limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/voice/phrase-bank/reload")
+async def reload_phrase_bank():
+    """Re-read the phrase list and re-synthesize the bank."""
+    try:
+        clips = await piper_tts_service.reload_phrase_bank()
+        return {"success": True, "clips": clips}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/voice/files/{filename}")
+async def download_voice_file(filename: str, request: Request):
+    """Download a generated voice file (supports Range, ETag/If-None-Match)."""
+    voice_file = piper_tts_service.find_voice_file(filename)
+    if not voice_file:
+        raise HTTPException(status_code=404, detail="Voice file not found")
+    
+    # Files never change once written; they only disappear on retention
+    file_path = voice_file["path"]
+    return build_file_response(
+        request,
+        file_path,
+        voice_file["size"],
+        voice_file["etag"],
+        audio_media_type(file_path.suffix.lstrip(".")),
+        f"public, max-age={voice_file['max_age']}, immutable"
+    )
\ No newline at end of file
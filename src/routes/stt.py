@@ -1,5 +1,14 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from src.utils import stt_service
+import asyncio
+import hmac
+import json
+import os
+import time
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Request, WebSocket
+from starlette.requests import ClientDisconnect
+from src.utils import stt_service, streaming_stt
+from src.utils.audio_encoder import audio_encoder
+from src.utils.disconnect import CLIENT_CLOSED_REQUEST
+from src.utils.upload_stream import AudioUpload, open_body_upload, open_file_upload, too_large_detail
 from pydantic import BaseModel
 from typing import Optional
 
@@ -10,32 +19,186 @@ class STTResponse(BaseModel):
     success: bool
     error: Optional[str] = None
 
+def _require_configured():
+    if not stt_service.is_configured():
+        raise HTTPException(
+            status_code=500, 
+            detail="AssemblyAI not configured. Add ASSEMBLYAI_API_KEY to environment"
+        )
+
+async def _transcribe_upload(upload: AudioUpload) -> STTResponse:
+    text = await stt_service.transcribe_audio(upload)
+    
+    if upload.too_large:
+        raise HTTPException(status_code=413, detail=too_large_detail(upload.max_bytes))
+    if not text:
+        raise HTTPException(status_code=500, detail="Transcription failed")
+    
+    return STTResponse(text=text, success=True)
+
 @router.post("/transcribe", response_model=STTResponse)
 async def transcribe_audio(audio: UploadFile = File(...)):
     try:
-        if not stt_service.is_configured():
-            raise HTTPException(
-                status_code=500, 
-                detail="AssemblyAI not configured. Add ASSEMBLYAI_API_KEY to environment"
-            )
-        
-        audio_data = await audio.read()
+        _require_configured()
         
-        if len(audio_data) == 0:
-            raise HTTPException(status_code=400, detail="Empty audio file")
+        # Audio is forwarded to AssemblyAI in chunks, never read into memory whole
+        upload = await open_file_upload(audio)
+        return await _transcribe_upload(upload)
         
-        text = await stt_service.transcribe_audio(audio_data)
-        
-        if not text:
-            raise HTTPException(status_code=500, detail="Transcription failed")
+    except HTTPException:
+        raise
+    except Exception as e:
+        return STTResponse(text="", success=False, error=str(e))
+
+@router.post("/transcribe/stream-upload", response_model=STTResponse)
+async def transcribe_audio_stream(request: Request):
+    """Transcribe the raw request body, relaying it to AssemblyAI while it uploads."""
+    try:
+        _require_configured()
         
-        return STTResponse(text=text, success=True)
+        upload = await open_body_upload(request)
+        return await _transcribe_upload(upload)
         
     except HTTPException:
         raise
+    except ClientDisconnect:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
     except Exception as e:
         return STTResponse(text="", success=False, error=str(e))
 
+class TranscriptWebhook(BaseModel):
+    transcript_id: str
+    status: str
+
+@router.post("/webhook")
+async def transcript_webhook(payload: TranscriptWebhook, request: Request):
+    """AssemblyAI completion callback; wakes the request waiting on the transcript."""
+    if stt_service.WEBHOOK_SECRET:
+        supplied = request.headers.get(stt_service.WEBHOOK_AUTH_HEADER, "")
+        if not hmac.compare_digest(supplied, stt_service.WEBHOOK_SECRET):
+            raise HTTPException(status_code=401, detail="Invalid webhook secret")
+    
+    waiting = stt_service.notify_completion(payload.transcript_id, payload.status)
+    return {"success": True, "waiting": waiting}
+
+STREAM_ENCODINGS = ["pcm", "opus"]
+# Opus is decoded to this rate before it reaches the recognizer
+STREAM_DECODE_SAMPLE_RATE = 16000
+STREAM_MAX_SECONDS = float(os.getenv("STT_STREAM_MAX_SECONDS", "300"))
+STREAM_FINAL_TIMEOUT_SECONDS = float(os.getenv("STT_STREAM_FINAL_TIMEOUT_SECONDS", "10"))
+
+@router.websocket("/stream")
+async def transcribe_stream(
+    websocket: WebSocket,
+    encoding: str = Query("pcm", description="Frame encoding: pcm (16-bit mono little-endian) or opus (Ogg/WebM)"),
+    sample_rate: int = Query(16000, ge=8000, le=48000, description="PCM sample rate")
+):
+    """
+    Real-time transcription. The client sends binary audio frames while the
+    user speaks and {"type": "end"} when they stop. The server pushes
+    {"type": "partial"|"final", "text"} as it recognizes speech, then
+    {"type": "done", "text"} with the whole transcript, or {"type": "error"}.
+    """
+    await websocket.accept()
+    if encoding not in STREAM_ENCODINGS:
+        await websocket.send_json({"type": "error", "error": f"Unsupported encoding. Supported: {STREAM_ENCODINGS}"})
+        await websocket.close(code=1003)
+        return
+    if not streaming_stt.is_configured():
+        await websocket.send_json({"type": "error", "error": "Streaming STT not configured"})
+        await websocket.close(code=1011)
+        return
+    if encoding == "opus" and not audio_encoder.is_available():
+        await websocket.send_json({"type": "error", "error": "Opus input needs ffmpeg; set FFMPEG_PATH"})
+        await websocket.close(code=1011)
+        return
+    
+    recognizer = streaming_stt.create_recognizer(sample_rate if encoding == "pcm" else STREAM_DECODE_SAMPLE_RATE)
+    client_gone = False
+    audio_ended_at = None
+    
+    async def client_audio():
+        nonlocal client_gone
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                client_gone = True
+                return
+            if message.get("bytes"):
+                yield message["bytes"]
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    continue
+                if isinstance(control, dict) and control.get("type") in ("end", "stop"):
+                    return
+    
+    async def relay_audio():
+        nonlocal audio_ended_at
+        audio = client_audio()
+        if encoding == "opus":
+            audio = audio_encoder.decode_stream(audio, STREAM_DECODE_SAMPLE_RATE)
+        async for pcm in audio:
+            await recognizer.send_audio(pcm)
+        audio_ended_at = time.monotonic()
+        await recognizer.finish()
+    
+    async def push_transcripts() -> str:
+        finals = []
+        async for event in recognizer.events():
+            if event["type"] == "final" and event["text"]:
+                finals.append(event["text"])
+            if not client_gone:
+                await websocket.send_json(event)
+        return " ".join(finals)
+    
+    streaming_stt.sessions_started.inc()
+    streaming_stt.active_sessions.set(streaming_stt.active_sessions.value + 1)
+    relay = None
+    transcripts = None
+    try:
+        await recognizer.start()
+        relay = asyncio.create_task(relay_audio())
+        transcripts = asyncio.create_task(push_transcripts())
+        
+        # Speech is capped at STREAM_MAX_SECONDS; the backend failing ends it early
+        await asyncio.wait({relay, transcripts}, timeout=STREAM_MAX_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+        if relay.done():
+            relay.result()
+            if client_gone:
+                return
+        elif not transcripts.done():
+            relay.cancel()
+            audio_ended_at = time.monotonic()
+            await recognizer.finish()
+        
+        text = await asyncio.wait_for(asyncio.shield(transcripts), STREAM_FINAL_TIMEOUT_SECONDS)
+        if audio_ended_at is not None:
+            streaming_stt.finalize_ms.observe((time.monotonic() - audio_ended_at) * 1000)
+        if not client_gone:
+            await websocket.send_json({"type": "done", "text": text})
+            await websocket.close()
+    except Exception as e:
+        streaming_stt.session_errors.inc()
+        print(f"Streaming STT error: {str(e) or type(e).__name__}")
+        if not client_gone:
+            try:
+                await websocket.send_json({"type": "error", "error": str(e) or type(e).__name__})
+                await websocket.close(code=1011)
+            except Exception:
+                pass
+    finally:
+        for task in (relay, transcripts):
+            if task is not None and not task.done():
+                task.cancel()
+        await recognizer.close()
+        streaming_stt.active_sessions.set(streaming_stt.active_sessions.value - 1)
+
 @router.get("/health")
 async def stt_health():
-    return {"configured": stt_service.is_configured()}
\ No newline at end of file
+    return {
+        "configured": stt_service.is_configured(),
+        "http_pool": stt_service.get_stats(),
+        "streaming": streaming_stt.get_stats()
+    }
\ No newline at end of file
@@ -1,52 +1,114 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query
+from typing import Optional
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Request
+from starlette.requests import ClientDisconnect
 from src.controllers.voice_chat_controller import (
     process_voice_chat, 
     VoiceChatRequest, 
     VoiceChatResponse
 )
+from src.utils.audio_response import RESPONSE_MODES
+from src.utils.disconnect import CLIENT_CLOSED_REQUEST, cancel_on_disconnect
 from src.utils import stt_service
+from src.utils.conversation_memory import require_session
 from src.utils.gemini_service import gemini_service
 from src.utils.piper_service import piper_tts_service
+from src.utils.upload_stream import AudioUpload, open_body_upload, open_file_upload, too_large_detail
 
 router = APIRouter()
 
+def _voice_chat_request(
+    response_mode: str,
+    include_voice_response: bool,
+    voice_format: str,
+    bypass_cache: bool,
+    session_id: Optional[str],
+    max_tokens: Optional[int]
+) -> VoiceChatRequest:
+    if response_mode not in RESPONSE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported response mode. Supported: {RESPONSE_MODES}")
+    
+    # Validate services
+    if not stt_service.is_configured():
+        raise HTTPException(status_code=500, detail="STT service not configured")
+    
+    if not gemini_service.is_configured():
+        raise HTTPException(status_code=500, detail="Gemini AI not configured")
+    
+    if include_voice_response and not piper_tts_service.is_configured():
+        raise HTTPException(status_code=500, detail="TTS service not configured")
+    
+    require_session(session_id)
+    
+    return VoiceChatRequest(
+        include_voice_response=include_voice_response,
+        voice_format=voice_format,
+        response_mode=response_mode,
+        bypass_cache=bypass_cache,
+        session_id=session_id,
+        max_tokens=max_tokens
+    )
+
+def _checked_response(response, upload: AudioUpload):
+    if upload.too_large:
+        raise HTTPException(status_code=413, detail=too_large_detail(upload.max_bytes))
+    if isinstance(response, VoiceChatResponse) and not response.success:
+        raise HTTPException(status_code=500, detail=response.error)
+    return response
+
 @router.post("/chat", response_model=VoiceChatResponse)
 async def voice_chat(
+    http_request: Request,
     audio: UploadFile = File(...),
     include_voice_response: bool = Query(True, description="Include AI voice response"),
-    voice_format: str = Query("wav", description="Voice format: wav, mp3, flac")
+    voice_format: str = Query("wav", description="Voice format: wav, opus, mp3, flac"),
+    response_mode: str = Query("json", description="Response mode: json (base64 audio), audio (raw audio, text in headers), multipart"),
+    bypass_cache: bool = Query(False, description="Skip the shared AI reply cache for personalized turns"),
+    session_id: Optional[str] = Query(None, description="Conversation session for multi-turn memory"),
+    max_tokens: Optional[int] = Query(None, ge=1, description="Cap on AI reply length in tokens")
 ):
     try:
-        # Validate services
-        if not stt_service.is_configured():
-            raise HTTPException(status_code=500, detail="STT service not configured")
-        
-        if not gemini_service.is_configured():
-            raise HTTPException(status_code=500, detail="Gemini AI not configured")
-        
-        if include_voice_response and not piper_tts_service.is_configured():
-            raise HTTPException(status_code=500, detail="TTS service not configured")
+        request = _voice_chat_request(
+            response_mode, include_voice_response, voice_format, bypass_cache, session_id, max_tokens
+        )
         
-        # Read audio data
-        audio_data = await audio.read()
-        if len(audio_data) == 0:
-            raise HTTPException(status_code=400, detail="Empty audio file")
+        # Audio is forwarded to STT in chunks, never read into memory whole
+        upload = await open_file_upload(audio)
         
         # Process voice chat
-        request = VoiceChatRequest(
-            include_voice_response=include_voice_response,
-            voice_format=voice_format
-        )
+        response = await cancel_on_disconnect(http_request, process_voice_chat(upload, request))
+        return _checked_response(response, upload)
         
-        response = await process_voice_chat(audio_data, request)
-        
-        if not response.success:
-            raise HTTPException(status_code=500, detail=response.error)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/chat/stream-upload", response_model=VoiceChatResponse)
+async def voice_chat_stream_upload(
+    http_request: Request,
+    include_voice_response: bool = Query(True, description="Include AI voice response"),
+    voice_format: str = Query("wav", description="Voice format: wav, opus, mp3, flac"),
+    response_mode: str = Query("json", description="Response mode: json (base64 audio), audio (raw audio, text in headers), multipart"),
+    bypass_cache: bool = Query(False, description="Skip the shared AI reply cache for personalized turns"),
+    session_id: Optional[str] = Query(None, description="Conversation session for multi-turn memory"),
+    max_tokens: Optional[int] = Query(None, ge=1, description="Cap on AI reply length in tokens")
+):
+    """Voice chat with the recording as the raw request body, relayed to STT while it uploads."""
+    try:
+        request = _voice_chat_request(
+            response_mode, include_voice_response, voice_format, bypass_cache, session_id, max_tokens
+        )
+        upload = await open_body_upload(http_request)
         
-        return response
+        # No cancel_on_disconnect: polling the connection would consume body
+        # chunks, and a client leaving mid-upload already aborts the stream
+        response = await process_voice_chat(upload, request)
+        return _checked_response(response, upload)
         
     except HTTPException:
         raise
+    except ClientDisconnect:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -55,5 +117,7 @@ async def voice_chat_health():
     return {
         "stt_configured": stt_service.is_configured(),
         "ai_configured": gemini_service.is_configured(),
-        "tts_configured": piper_tts_service.is_configured()
+        "tts_configured": piper_tts_service.is_configured(),
+        "gemini": gemini_service.get_stats(),
+        "stt_http_pool": stt_service.get_stats()
     }
\ No newline at end of file
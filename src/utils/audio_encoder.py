@@ -0,0 +1,156 @@
+'''
+Compressed audio encoding (Opus, MP3, FLAC) through an ffmpeg subprocess, and
+decoding of streamed client audio back to PCM.
+
+Audio is piped into ffmpeg as it arrives and encoded bytes are yielded as soon
+as ffmpeg produces them, so encoding overlaps synthesis and never runs on the
+event loop thread.
+'''
+
+import asyncio
+import os
+import shutil
+import time
+from typing import AsyncIterator, List, Optional
+
+from src.utils.metrics import metrics
+
+ENCODED_BYTES_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+ENCODE_MS_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class AudioEncodingError(Exception):
+    """Raised when ffmpeg fails to encode or decode audio."""
+
+
+class AudioEncoder:
+    def __init__(self):
+        self.ffmpeg_path: Optional[str] = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+        self.codec_args = {
+            "opus": ["-c:a", "libopus", "-b:a", os.getenv("TTS_OPUS_BITRATE", "24k"), "-ar", "24000", "-f", "ogg"],
+            "mp3": ["-c:a", "libmp3lame", "-b:a", os.getenv("TTS_MP3_BITRATE", "48k"), "-f", "mp3"],
+            "flac": ["-c:a", "flac", "-f", "flac"]
+        }
+
+        self.encoded_bytes = metrics.histogram(
+            "tts_encoded_bytes", ENCODED_BYTES_BUCKETS, "Size of encoded audio per request"
+        )
+        self.encode_ms = metrics.histogram(
+            "tts_encode_ms", ENCODE_MS_BUCKETS, "Wall time spent encoding audio per request"
+        )
+        self.encode_failures = metrics.counter("tts_encode_failures", "Audio encodes that failed")
+
+    def is_available(self) -> bool:
+        return bool(self.ffmpeg_path) and os.path.exists(self.ffmpeg_path)
+
+    def get_supported_formats(self) -> List[str]:
+        return list(self.codec_args) if self.is_available() else []
+
+    def _command(self, output_format: str, input_format: str, sample_rate: int) -> List[str]:
+        if input_format == "pcm":
+            input_args = ["-f", "s16le", "-ar", str(sample_rate), "-ac", "1"]
+        else:
+            input_args = ["-f", "wav"]
+        return [
+            self.ffmpeg_path,
+            "-hide_banner", "-loglevel", "error",
+            *input_args, "-i", "pipe:0",
+            "-ac", "1",
+            *self.codec_args[output_format],
+            "pipe:1"
+        ]
+
+    async def encode_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        output_format: str,
+        input_format: str = "wav",
+        sample_rate: int = 22050
+    ) -> AsyncIterator[bytes]:
+        """
+        Encode audio chunks as they arrive. input_format is "wav" (a WAV stream)
+        or "pcm" (16-bit mono little-endian at sample_rate).
+        """
+        if output_format not in self.codec_args:
+            raise AudioEncodingError(f"Unsupported output format '{output_format}'")
+
+        started = time.monotonic()
+        total_bytes = 0
+        try:
+            async for data in self._pipe(self._command(output_format, input_format, sample_rate), chunks):
+                total_bytes += len(data)
+                yield data
+        except Exception:
+            self.encode_failures.inc()
+            raise
+
+        self.encoded_bytes.observe(total_bytes)
+        self.encode_ms.observe((time.monotonic() - started) * 1000)
+
+    async def decode_stream(self, chunks: AsyncIterator[bytes], sample_rate: int = 16000) -> AsyncIterator[bytes]:
+        """
+        Decode compressed audio (Ogg/WebM Opus and anything else ffmpeg detects)
+        to 16-bit mono little-endian PCM at sample_rate, as the chunks arrive.
+        """
+        command = [
+            self.ffmpeg_path,
+            "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-ac", "1", "-ar", str(sample_rate), "-f", "s16le",
+            "pipe:1"
+        ]
+        async for data in self._pipe(command, chunks):
+            yield data
+
+    async def _pipe(self, command: List[str], chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        if not self.is_available():
+            raise AudioEncodingError("ffmpeg is not available; set FFMPEG_PATH")
+
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        async def feed():
+            try:
+                async for chunk in chunks:
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+            finally:
+                process.stdin.close()
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                data = await process.stdout.read(65536)
+                if not data:
+                    break
+                yield data
+
+            await feeder
+            stderr = await process.stderr.read()
+            if await process.wait() != 0:
+                raise AudioEncodingError(stderr.decode("utf-8", errors="replace").strip())
+        finally:
+            if not feeder.done():
+                feeder.cancel()
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+
+    async def encode(self, audio: bytes, output_format: str, input_format: str = "wav", sample_rate: int = 22050) -> bytes:
+        async def single_chunk():
+            yield audio
+
+        parts = []
+        async for data in self.encode_stream(single_chunk(), output_format, input_format, sample_rate):
+            parts.append(data)
+        return b"".join(parts)
+
+
+audio_encoder = AudioEncoder()
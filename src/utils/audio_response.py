@@ -0,0 +1,180 @@
+'''
+Binary delivery of synthesized audio.
+
+Besides the default JSON body (audio as base64), chat endpoints can answer with
+the raw audio and the text in headers ("audio"), or with a multipart/mixed body
+holding the JSON metadata followed by the binary audio part ("multipart").
+Both send the synthesized bytes as-is, without base64 or JSON re-encoding.
+'''
+
+import json
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+RESPONSE_MODES = ["json", "audio", "multipart"]
+
+AUDIO_MEDIA_TYPES = {
+    "wav": "audio/wav",
+    "opus": "audio/ogg",
+    "mp3": "audio/mpeg",
+    "flac": "audio/flac"
+}
+
+# Headers carrying the text side of an "audio" response; values are
+# percent-encoded UTF-8 because HTTP headers are latin-1 only.
+TEXT_HEADERS = {
+    "message": "X-Jessy-Message",
+    "transcribed_text": "X-Jessy-Transcribed-Text",
+    "ai_response": "X-Jessy-AI-Response",
+    "voice_filename": "X-Jessy-Voice-Filename"
+}
+
+
+def audio_media_type(voice_format: str) -> str:
+    return AUDIO_MEDIA_TYPES.get(voice_format, "application/octet-stream")
+
+
+def build_audio_response(audio: bytes, voice_format: str, metadata: Dict[str, Optional[str]]) -> Response:
+    """Raw audio body with the reply text in X-Jessy-* headers."""
+    headers = {}
+    for field, header in TEXT_HEADERS.items():
+        value = metadata.get(field)
+        if value:
+            headers[header] = quote(value, safe="")
+    if metadata.get("voice_filename"):
+        headers["Content-Disposition"] = f'inline; filename="{metadata["voice_filename"]}"'
+    return Response(content=audio, media_type=audio_media_type(voice_format), headers=headers)
+
+
+def build_multipart_response(metadata: dict, audio: bytes, voice_format: str) -> StreamingResponse:
+    """multipart/mixed body: a JSON metadata part followed by the audio part."""
+    boundary = uuid.uuid4().hex
+    filename = metadata.get("voice_filename") or f"voice.{voice_format}"
+
+    metadata_part = (
+        f"--{boundary}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        "Content-Disposition: inline; name=\"metadata\"\r\n\r\n"
+        f"{json.dumps(metadata, ensure_ascii=False)}\r\n"
+    ).encode("utf-8")
+    audio_header = (
+        f"--{boundary}\r\n"
+        f"Content-Type: {audio_media_type(voice_format)}\r\n"
+        f"Content-Disposition: attachment; name=\"audio\"; filename=\"{filename}\"\r\n"
+        f"Content-Length: {len(audio)}\r\n\r\n"
+    ).encode("utf-8")
+    closing = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+    def parts() -> Iterator[bytes]:
+        # The audio is yielded as its own chunk so it is never concatenated
+        # into a second buffer.
+        yield metadata_part
+        yield audio_header
+        yield audio
+        yield closing
+
+    content_length = len(metadata_part) + len(audio_header) + len(audio) + len(closing)
+    return StreamingResponse(
+        parts(),
+        media_type=f"multipart/mixed; boundary={boundary}",
+        headers={"Content-Length": str(content_length)}
+    )
+
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def _parse_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range into inclusive offsets.
+    Returns None when the header should be ignored (malformed, multi-range or
+    ending before it starts) and raises ValueError when the range starts past
+    the end of the file.
+    """
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header)
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+
+    start_text, end_text = match.groups()
+    if not start_text:
+        # Suffix range: the last N bytes
+        length = int(end_text)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, file_size - length), file_size - 1
+
+    start = int(start_text)
+    if end_text and int(end_text) < start:
+        # Syntactically invalid (RFC 7233 2.1): ignore it and send the whole file
+        return None
+    if start >= file_size:
+        raise ValueError("Range not satisfiable")
+    end = int(end_text) if end_text else file_size - 1
+    return start, min(end, file_size - 1)
+
+
+def _read_range(file_path: Path, start: int, end: int) -> Iterator[bytes]:
+    with open(file_path, "rb") as audio_file:
+        audio_file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = audio_file.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def build_file_response(
+    request: Request,
+    file_path: Path,
+    file_size: int,
+    etag: str,
+    media_type: str,
+    cache_control: str
+) -> Response:
+    """
+    Serve a stored audio file with ETag revalidation and single-range support.
+    Full responses go through FileResponse so the server can use sendfile.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes"
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range validator means the client gets the whole file again
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, file_size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{file_size}"}
+            )
+        if byte_range:
+            start, end = byte_range
+            return StreamingResponse(
+                _read_range(file_path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers={
+                    **headers,
+                    "Content-Range": f"bytes {start}-{end}/{file_size}",
+                    "Content-Length": str(end - start + 1)
+                }
+            )
+
+    return FileResponse(file_path, media_type=media_type, headers=headers)
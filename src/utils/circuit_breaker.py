@@ -0,0 +1,74 @@
+'''
+Circuit breaker for an upstream dependency.
+
+After `failure_threshold` consecutive failures the circuit opens and calls fail
+fast for `reset_timeout` seconds. Then a single probe call is let through
+(half-open): success closes the circuit, failure opens it again.
+'''
+
+import time
+
+from src.utils.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.rejections = metrics.counter(f"{name}_circuit_rejections", "Calls rejected while the circuit was open")
+        self.opens = metrics.counter(f"{name}_circuit_opens", "Times the circuit opened")
+        self.state_gauge = metrics.gauge(f"{name}_circuit_open", "1 while the circuit is open or half-open")
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream; counts a rejection when it may not."""
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.rejections.inc()
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._probe_in_flight = False
+        self.state = CLOSED
+        self.state_gauge.set(0)
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opens.inc()
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self.state_gauge.set(1)
+
+    def record_cancelled(self):
+        # A cancelled probe tells nothing about the upstream; allow another
+        self._probe_in_flight = False
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opens": self.opens.value,
+            "rejections": self.rejections.value
+        }
@@ -0,0 +1,224 @@
+'''
+Per-session conversation memory with a bounded context window.
+
+Each session keeps its recent turns verbatim plus a running summary of
+everything older. Once the verbatim turns outgrow the token budget, the oldest
+are folded into the summary in the background. The context sent to Gemini
+never exceeds the budget, even while a summarization is still running, so
+prompt size stays flat however long a conversation lasts.
+
+Session ids are issued by the server and unguessable, so one caller cannot read
+or clear another's conversation by picking its id.
+'''
+
+import asyncio
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from src.utils.gemini_service import gemini_service
+from src.utils.metrics import metrics
+
+# Rough token estimate; good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+MAX_VERBATIM_TURNS = 50
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def format_turns(turns: List[Tuple[str, str]]) -> str:
+    return "".join(f"User: {user}\nAssistant: {assistant}\n" for user, assistant in turns)
+
+
+class ConversationSession:
+    def __init__(self):
+        self.turns: List[Tuple[str, str]] = []
+        self.summary = ""
+        self.last_active = time.monotonic()
+        self.summarizing: Optional[asyncio.Task] = None
+        # After a failed summarization the next attempt waits until retry_at
+        self.failed_folds = 0
+        self.retry_at = 0.0
+
+
+class ConversationMemory:
+    def __init__(
+        self,
+        summarize: Callable[[str, str], Awaitable[str]],
+        max_context_tokens: int = 1200,
+        max_sessions: int = 1000,
+        session_ttl: float = 6 * 3600,
+        retry_delay: float = 30.0,
+        max_retry_delay: float = 600.0
+    ):
+        # summarize(previous_summary, transcript) returns the new summary
+        self.summarize = summarize
+        self.max_context_tokens = max_context_tokens
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        # session_id -> session, least recently active first
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+
+        self.summarizations = metrics.counter("conversation_summarizations", "Turn batches folded into a summary")
+        self.summarize_failures = metrics.counter("conversation_summarize_failures", "Failed summarizations")
+        self.context_tokens = metrics.histogram(
+            "conversation_context_tokens", [100, 250, 500, 1000, 2000, 4000], "Estimated tokens of context per turn"
+        )
+
+    def create_session(self) -> str:
+        self._evict_idle()
+        session_id = secrets.token_urlsafe(24)
+        self._sessions[session_id] = ConversationSession()
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            self._cancel(evicted)
+        return session_id
+
+    def has_session(self, session_id: str) -> bool:
+        self._evict_idle()
+        return session_id in self._sessions
+
+    def _session(self, session_id: str) -> Optional[ConversationSession]:
+        self._evict_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        session.last_active = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.session_ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_active >= cutoff:
+                break
+            del self._sessions[session_id]
+            self._cancel(session)
+
+    @staticmethod
+    def _summarizing(session: ConversationSession) -> bool:
+        return session.summarizing is not None and not session.summarizing.done()
+
+    @classmethod
+    def _cancel(cls, session: ConversationSession):
+        if cls._summarizing(session):
+            session.summarizing.cancel()
+
+    def _turn_budget(self, session: ConversationSession) -> int:
+        return max(0, self.max_context_tokens - estimate_tokens(session.summary))
+
+    def context(self, session_id: str) -> str:
+        """Summary plus as many recent turns as fit the token budget, oldest first."""
+        session = self._session(session_id)
+        if session is None:
+            return ""
+        budget = self._turn_budget(session)
+        recent = []
+        used = 0
+        for turn in reversed(session.turns):
+            tokens = estimate_tokens(format_turns([turn]))
+            if used + tokens > budget:
+                break
+            recent.append(turn)
+            used += tokens
+        recent.reverse()
+
+        context = ""
+        if session.summary:
+            context += f"Summary of the earlier conversation: {session.summary}\n\n"
+        context += format_turns(recent)
+        self.context_tokens.observe(estimate_tokens(context))
+        return context
+
+    def add_turn(self, session_id: str, user_text: str, assistant_text: str):
+        session = self._session(session_id)
+        if session is None:
+            # Evicted or cleared while the reply was generated
+            return
+        session.turns.append((user_text, assistant_text))
+        if len(session.turns) > MAX_VERBATIM_TURNS and not self._summarizing(session):
+            # Summarization keeps failing; don't let the session grow without bound
+            del session.turns[:-MAX_VERBATIM_TURNS]
+
+        turn_tokens = sum(estimate_tokens(format_turns([turn])) for turn in session.turns)
+        if (
+            turn_tokens > self._turn_budget(session)
+            and not self._summarizing(session)
+            and time.monotonic() >= session.retry_at
+        ):
+            session.summarizing = asyncio.create_task(self._fold(session))
+
+    async def _fold(self, session: ConversationSession):
+        # Fold the older half of the verbatim turns; the newest stay verbatim
+        fold_count = max(1, len(session.turns) // 2)
+        folded = session.turns[:fold_count]
+        try:
+            summary = await self.summarize(session.summary, format_turns(folded))
+        except Exception as e:
+            print(f"Conversation summarization failed: {str(e)}")
+            self._back_off(session)
+            return
+
+        if not summary:
+            self._back_off(session)
+            return
+        # Only the turns that were summarized are dropped; turns added meanwhile stay
+        del session.turns[:fold_count]
+        session.summary = summary.strip()
+        session.failed_folds = 0
+        self.summarizations.inc()
+
+    def _back_off(self, session: ConversationSession):
+        # Exponential per session, so a failing Gemini isn't hit again on every turn
+        self.summarize_failures.inc()
+        delay = min(self.retry_delay * 2 ** session.failed_folds, self.max_retry_delay)
+        session.failed_folds += 1
+        session.retry_at = time.monotonic() + delay
+
+    def clear(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._cancel(session)
+        return True
+
+    async def close(self):
+        for session in self._sessions.values():
+            self._cancel(session)
+
+    def get_stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_context_tokens": self.max_context_tokens,
+            "summarizations": self.summarizations.value,
+            "summarize_failures": self.summarize_failures.value
+        }
+
+
+conversation_memory = ConversationMemory(
+    gemini_service.summarize_conversation,
+    max_context_tokens=int(os.getenv("CONVERSATION_CONTEXT_TOKENS", "1200")),
+    max_sessions=int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000")),
+    session_ttl=float(os.getenv("CONVERSATION_SESSION_TTL_HOURS", "6")) * 3600,
+    retry_delay=float(os.getenv("CONVERSATION_SUMMARY_RETRY_SECONDS", "30"))
+)
+
+
+def require_session(session_id: Optional[str]):
+    """Reject session ids this server did not issue, or that have expired."""
+    if session_id and not conversation_memory.has_session(session_id):
+        raise HTTPException(
+            status_code=404,
+            detail="Unknown or expired session_id; create one with POST /ai/chat/sessions"
+        )
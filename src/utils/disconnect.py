@@ -0,0 +1,33 @@
+'''
+Cancel request work when the HTTP client goes away.
+
+Starlette keeps running a handler after the client disconnects, so a slow LLM
+call would still hold a concurrency slot for nobody. cancel_on_disconnect runs
+the work as a task, polls the connection while it runs and cancels it as soon
+as the client is gone.
+'''
+
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import HTTPException, Request
+
+T = TypeVar("T")
+
+# nginx's "client closed request"; never seen by the client, only in logs
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T], poll_interval: float = 0.25) -> T:
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
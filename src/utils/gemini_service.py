@@ -1,11 +1,58 @@
 import os
+import asyncio
+import datetime
+import functools
+import hashlib
+import json
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 import google.generativeai as genai
-from typing import Optional
+from google.generativeai import caching
+from typing import AsyncIterator, Optional
 from dotenv import load_dotenv
 from src.constants.prompt import system_prompt
+from src.utils.circuit_breaker import CircuitBreaker
+from src.utils.llm_cache import LLMResponseCache
+from src.utils.metrics import metrics
+from src.utils.response_budget import STOP_SEQUENCES, TEXT_MAX_TOKENS, truncate_to_sentence
+from src.utils.single_flight import SingleFlight
 
 load_dotenv()
 
+FALLBACK_REPLY = "Sorry, I couldn't generate a response at this time."
+
+# Spoken instead of waiting on Gemini while its circuit breaker is open; the app
+# registers it with the phrase bank at startup, so the audio is ready immediately
+UNAVAILABLE_REPLY = os.getenv(
+    "GEMINI_UNAVAILABLE_REPLY", "I'm having a little trouble right now. Let's try again in a moment."
+)
+
+HEDGE_MIN_SAMPLES = 20
+
+SUMMARY_MAX_TOKENS = 300
+
+TOKEN_BUCKETS = [64, 128, 256, 512, 1024, 2048, 4096, 8192]
+
+GEMINI_MS_BUCKETS = [100, 250, 500, 1000, 2000, 4000, 8000, 15000, 30000]
+
+
+class LLMError(Exception):
+    """Raised when Gemini fails to produce a reply."""
+
+
+class LLMTimeoutError(LLMError):
+    """Raised when a Gemini call misses its deadline."""
+
+
+class LLMUnavailableError(LLMError):
+    """Raised without calling Gemini while its circuit breaker is open."""
+
+
+class LLMOverloadedError(LLMError):
+    """Raised when no local concurrency slot frees up in time; Gemini was never called."""
+
+
 class GeminiService:
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
@@ -15,34 +62,491 @@ class GeminiService:
         self.system_prompt = system_prompt
         
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        self.model_name = 'gemini-2.0-flash-exp'
+        # The persona goes in as a system instruction rather than being pasted
+        # in front of every prompt; startup() may swap in a context-cached model
+        self._inline_model = genai.GenerativeModel(self.model_name, system_instruction=self.system_prompt)
+        self.model = self._inline_model
+        self.summary_model = genai.GenerativeModel(self.model_name)
+        
+        self.context_cache_enabled = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+        self.context_cache_ttl = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+        self._cached_content = None
+        self._cache_refresh_task: Optional[asyncio.Task] = None
+        
+        # Calls go through the SDK's async client; the semaphore caps how many
+        # are in flight so a burst of chats queues instead of piling onto the API
+        self.max_concurrency = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+        self.request_timeout = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+        # Queueing is a local overload, not a Gemini fault: it has its own
+        # limit and never counts against the circuit breaker
+        self.queue_timeout = float(os.getenv("GEMINI_QUEUE_TIMEOUT_SECONDS", "10"))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        
+        self.hedge_enabled = os.getenv("GEMINI_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_min_delay = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_MS", "800")) / 1000
+        # Recent successful call latencies (seconds) for the p95 hedge delay
+        self._latencies = deque(maxlen=200)
+        self.breaker = CircuitBreaker(
+            "gemini",
+            failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+        )
+        # Background summaries are tracked apart so their failures never open
+        # the circuit that user-facing replies depend on
+        self.summary_breaker = CircuitBreaker(
+            "gemini_summary",
+            failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+        )
+        
+        self.in_flight = metrics.gauge("gemini_in_flight", "Gemini calls currently running")
+        self.queue_wait_ms = metrics.histogram(
+            "gemini_queue_wait_ms", GEMINI_MS_BUCKETS, "Time spent waiting for a Gemini concurrency slot"
+        )
+        self.request_ms = metrics.histogram(
+            "gemini_request_ms", GEMINI_MS_BUCKETS, "Gemini call latency"
+        )
+        self.timeouts = metrics.counter("gemini_timeouts", "Gemini calls that hit the timeout")
+        self.overloads = metrics.counter("gemini_overloads", "Calls rejected after waiting too long for a slot")
+        self.hedges = metrics.counter("gemini_hedges", "Hedged duplicate Gemini requests sent")
+        self.hedge_wins = metrics.counter("gemini_hedge_wins", "Hedged duplicates that finished first")
+        self.prompt_tokens = metrics.counter("gemini_prompt_tokens", "Input tokens billed across Gemini calls")
+        self.cached_tokens = metrics.counter("gemini_cached_tokens", "Input tokens served from the context cache")
+        self.output_tokens = metrics.counter("gemini_output_tokens", "Output tokens generated across Gemini calls")
+        self.truncations = metrics.counter(
+            "gemini_truncations", "Replies trimmed to the last full sentence after hitting the token cap"
+        )
+        self.prompt_tokens_per_call = metrics.histogram(
+            "gemini_prompt_tokens_per_call", TOKEN_BUCKETS, "Input tokens per Gemini call"
+        )
+        
+        self._flights = SingleFlight("gemini")
+        
+        self.response_cache = None
+        if os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true":
+            self.response_cache = LLMResponseCache(
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")),
+                max_prompt_chars=int(os.getenv("LLM_CACHE_MAX_PROMPT_CHARS", "200")),
+                redis_url=os.getenv("REDIS_URL")
+            )
+    
+    def _generation_config(self, max_tokens: Optional[int]) -> dict:
+        return {
+            "temperature": 0.7,
+            "top_p": 0.8,
+            "top_k": 40,
+            "max_output_tokens": max_tokens,
+            "stop_sequences": STOP_SEQUENCES,
+        }
+    
+    def _full_prompt(self, prompt: str, context: str = "") -> str:
+        # context holds earlier turns of the conversation as "User:/Assistant:" lines
+        return f"{context}User: {prompt}\nAssistant:"
     
-    async def generate_text(self, prompt: str, max_tokens: Optional[int] = 1000) -> str:
+    def _cache_key(self, prompt: str, max_tokens: Optional[int], use_cache: bool, context: str = "") -> Optional[str]:
+        if not self.response_cache:
+            return None
+        # Personalized turns (and any turn with history) must never be answered
+        # with someone else's reply
+        if not use_cache or context:
+            self.response_cache.record_bypass()
+            return None
+        if not self.response_cache.cacheable(prompt):
+            return None
+        return LLMResponseCache.make_key(
+            prompt, self.system_prompt, self.model_name, self._generation_config(max_tokens)
+        )
+    
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the GEMINI_MAX_CONCURRENCY call slots; raises LLMOverloadedError if none frees up."""
+        queued = time.monotonic()
         try:
-            generation_config = {
-                "temperature": 0.7,
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": max_tokens,
-            }
-            
-            full_prompt = f"{self.system_prompt}\n\nUser: {prompt}\nAssistant:"
-            
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=generation_config
-            )
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.overloads.inc()
+            raise LLMOverloadedError(f"No Gemini slot free within {self.queue_timeout}s") from None
+        
+        started = time.monotonic()
+        self.queue_wait_ms.observe((started - queued) * 1000)
+        self._in_flight += 1
+        self.in_flight.set(self._in_flight)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self.in_flight.set(self._in_flight)
+            self.request_ms.observe((time.monotonic() - started) * 1000)
+            self._semaphore.release()
+    
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        # Chunks without parts (e.g. the final finish_reason chunk) raise on .text
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+    
+    @staticmethod
+    def _finish_reason(response) -> Optional[str]:
+        candidates = getattr(response, "candidates", None)
+        if not candidates:
+            return None
+        reason = getattr(candidates[0], "finish_reason", None)
+        return getattr(reason, "name", None) if reason is not None else None
+    
+    def _trim(self, reply: str, finish_reason: Optional[str]) -> str:
+        # A reply cut off by the token cap ends mid-sentence; don't speak that part
+        if finish_reason == "MAX_TOKENS":
+            self.truncations.inc()
+            return truncate_to_sentence(reply)
+        return reply
+    
+    def _usage(self, response) -> dict:
+        """Token counts for one call, also added to the token metrics."""
+        usage = getattr(response, "usage_metadata", None)
+        counts = {
+            "prompt_tokens": getattr(usage, "prompt_token_count", None),
+            "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+            "completion_tokens": getattr(usage, "candidates_token_count", None),
+            "total_tokens": getattr(usage, "total_token_count", None)
+        }
+        if counts["prompt_tokens"] is not None:
+            self.prompt_tokens.inc(counts["prompt_tokens"])
+            self.prompt_tokens_per_call.observe(counts["prompt_tokens"])
+        self.cached_tokens.inc(counts["cached_tokens"])
+        if counts["completion_tokens"] is not None:
+            self.output_tokens.inc(counts["completion_tokens"])
+        return counts
+    
+    def _request_key(self, prompt: str, max_tokens: Optional[int], context: str = "") -> str:
+        payload = json.dumps([self._full_prompt(prompt, context), self._generation_config(max_tokens)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _hedge_delay(self) -> float:
+        """Seconds before a hedged duplicate is sent: the recent p95 latency."""
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return self.hedge_min_delay
+        ordered = sorted(self._latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return max(self.hedge_min_delay, p95)
+    
+    async def _attempt(self, model, contents: str, generation_config: dict, timeout: float):
+        async with self._slot():
+            # The deadline starts once the slot is held, so it only measures Gemini
+            started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(
+                    model.generate_content_async(contents, generation_config=generation_config),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"Gemini did not reply within {timeout}s") from None
+            self._latencies.append(time.monotonic() - started)
+            return response
+    
+    async def _hedged(self, model, contents: str, generation_config: dict, timeout: float):
+        """
+        Send the request; if it is slower than the recent p95, send a duplicate
+        and keep whichever succeeds first. The duplicate only goes out when a
+        concurrency slot is free, so hedging never queues behind real traffic.
+        """
+        primary = asyncio.create_task(self._attempt(model, contents, generation_config, timeout))
+        tasks = {primary}
+        try:
+            if self.hedge_enabled:
+                done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay())
+                if not done and not self._semaphore.locked():
+                    self.hedges.inc()
+                    tasks.add(asyncio.create_task(self._attempt(model, contents, generation_config, timeout)))
             
-            if response.text:
-                return response.text.strip()
-            else:
-                return "Sorry, I couldn't generate a response at this time."
-                
+            error = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins.inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _call(
+        self,
+        model,
+        contents: str,
+        generation_config: dict,
+        timeout: Optional[float],
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        One logical Gemini call: circuit breaker, per-attempt deadline, hedging
+        and typed errors. Only upstream errors and timeouts count as breaker
+        failures; running out of local slots does not.
+        """
+        breaker = breaker or self.breaker
+        if not breaker.allow():
+            raise LLMUnavailableError("Gemini is unavailable (circuit open)")
+        
+        timeout = timeout or self.request_timeout
+        try:
+            response = await self._hedged(model, contents, generation_config, timeout)
+        except LLMOverloadedError:
+            breaker.record_cancelled()
+            raise
+        except LLMTimeoutError:
+            self.timeouts.inc()
+            breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            raise LLMError(f"Gemini request failed: {str(e)}") from e
+        
+        breaker.record_success()
+        self._usage(response)
+        return response
+    
+    async def generate_text(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = TEXT_MAX_TOKENS,
+        use_cache: bool = True,
+        context: str = "",
+        timeout: Optional[float] = None
+    ) -> str:
+        """
+        Reply to prompt. timeout is the deadline for Gemini to answer once a
+        slot is held (GEMINI_TIMEOUT_SECONDS by default); waiting for the slot
+        is bounded separately by GEMINI_QUEUE_TIMEOUT_SECONDS. Raises
+        LLMTimeoutError, LLMOverloadedError, LLMUnavailableError or LLMError.
+        """
+        cache_key = self._cache_key(prompt, max_tokens, use_cache, context)
+        if cache_key:
+            cached_reply = await self.response_cache.get(cache_key)
+            if cached_reply is not None:
+                return cached_reply
+        
+        # Identical prompts already in flight share one Gemini call
+        return await self._flights.do(
+            cache_key or self._request_key(prompt, max_tokens, context),
+            lambda: self._generate_text(prompt, max_tokens, cache_key, context, timeout)
+        )
+    
+    async def _generate_text(
+        self,
+        prompt: str,
+        max_tokens: Optional[int],
+        cache_key: Optional[str],
+        context: str,
+        timeout: Optional[float]
+    ) -> str:
+        response = await self._call(
+            self.model, self._full_prompt(prompt, context), self._generation_config(max_tokens), timeout
+        )
+        
+        reply = self._chunk_text(response).strip()
+        if not reply:
+            return FALLBACK_REPLY
+        
+        reply = self._trim(reply, self._finish_reason(response))
+        if cache_key:
+            await self.response_cache.put(cache_key, reply)
+        return reply
+    
+    async def stream_text(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = TEXT_MAX_TOKENS,
+        usage: Optional[dict] = None,
+        use_cache: bool = True,
+        context: str = "",
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield the reply as Gemini streams it. Once a slot is held, timeout
+        bounds the wait for the first chunk and for each chunk after it. When a usage dict is passed it
+        is filled with token counts once the stream ends. A cached reply is
+        yielded as a single chunk. Raises the same errors as generate_text;
+        streams are not hedged since text may already have reached the client.
+        """
+        cache_key = self._cache_key(prompt, max_tokens, use_cache, context)
+        if cache_key:
+            cached_reply = await self.response_cache.get(cache_key)
+            if cached_reply is not None:
+                if usage is not None:
+                    usage.update({
+                        "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+                        "cached": True
+                    })
+                yield cached_reply
+                return
+        
+        if not self.breaker.allow():
+            raise LLMUnavailableError("Gemini is unavailable (circuit open)")
+        
+        timeout = timeout or self.request_timeout
+        parts = []
+        finish_reason = None
+        try:
+            async with self._slot():
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(
+                        self._full_prompt(prompt, context),
+                        generation_config=self._generation_config(max_tokens),
+                        stream=True
+                    ),
+                    timeout=timeout
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        break
+                    finish_reason = self._finish_reason(chunk) or finish_reason
+                    text = self._chunk_text(chunk)
+                    if text:
+                        parts.append(text)
+                        yield text
+        except LLMOverloadedError:
+            self.breaker.record_cancelled()
+            raise
+        except asyncio.TimeoutError:
+            self.timeouts.inc()
+            self.breaker.record_failure()
+            raise LLMTimeoutError(f"Gemini stream stalled for {timeout}s") from None
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.record_cancelled()
+            raise
         except Exception as e:
-            print(f"Error generating text with Gemini: {str(e)}")
-            return f"Error: Unable to generate response - {str(e)}"
+            self.breaker.record_failure()
+            raise LLMError(f"Gemini request failed: {str(e)}") from e
+        self.breaker.record_success()
+        
+        call_usage = self._usage(response)
+        reply = "".join(parts).strip()
+        trimmed = self._trim(reply, finish_reason)
+        if usage is not None:
+            usage.update(call_usage)
+            # Already-streamed text can't be recalled; tell the consumer instead
+            usage.update({"finish_reason": finish_reason, "truncated": trimmed != reply})
+        reply = trimmed
+        if cache_key and reply:
+            await self.response_cache.put(cache_key, reply)
+    
+    async def summarize_conversation(self, previous_summary: str, transcript: str) -> str:
+        """Fold older conversation turns into the running summary; raises LLMError on failure."""
+        prompt = (
+            "Update the summary of a conversation between an older adult (User) and "
+            "Jessy, their voice assistant (Assistant). Keep names, health details, "
+            "mood, preferences and anything Jessy promised to follow up on. Answer "
+            "with the updated summary only, in at most five sentences, in the "
+            "language of the conversation.\n\n"
+            f"Current summary: {previous_summary or '(none)'}\n\n"
+            f"Turns to add:\n{transcript}"
+        )
+        response = await self._call(
+            self.summary_model,
+            prompt,
+            {"temperature": 0.2, "max_output_tokens": SUMMARY_MAX_TOKENS},
+            None,
+            breaker=self.summary_breaker
+        )
+        return self._chunk_text(response).strip()
     
     def is_configured(self) -> bool:
         return bool(self.api_key)
+    
+    async def startup(self):
+        """Create the provider-side context cache for the system prompt when enabled."""
+        if not self.context_cache_enabled or self._cached_content:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            self._cached_content = await asyncio.wait_for(
+                loop.run_in_executor(None, functools.partial(
+                    caching.CachedContent.create,
+                    model=self.model_name,
+                    display_name="jessy-system-prompt",
+                    system_instruction=self.system_prompt,
+                    ttl=datetime.timedelta(seconds=self.context_cache_ttl)
+                )),
+                timeout=self.request_timeout
+            )
+        except Exception as e:
+            # Too short to cache or unsupported for this model: implicit
+            # caching of the system instruction still applies
+            print(f"Gemini context cache unavailable, sending the system instruction inline: {str(e)}")
+            return
+        self.model = genai.GenerativeModel.from_cached_content(self._cached_content)
+        self._cache_refresh_task = asyncio.create_task(self._refresh_context_cache())
+    
+    async def _refresh_context_cache(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.context_cache_ttl / 2)
+            try:
+                await loop.run_in_executor(None, functools.partial(
+                    self._cached_content.update, ttl=datetime.timedelta(seconds=self.context_cache_ttl)
+                ))
+            except Exception as e:
+                print(f"Gemini context cache refresh failed, sending the system instruction inline: {str(e)}")
+                self.model = self._inline_model
+                self._cached_content = None
+                return
+    
+    async def close(self):
+        if self._cache_refresh_task:
+            self._cache_refresh_task.cancel()
+            self._cache_refresh_task = None
+        if self._cached_content:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._cached_content.delete)
+            except Exception as e:
+                print(f"Failed to delete the Gemini context cache: {str(e)}")
+            self._cached_content = None
+            self.model = self._inline_model
+        if self.response_cache:
+            await self.response_cache.close()
+    
+    def get_stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.request_timeout,
+            "queue_timeout_seconds": self.queue_timeout,
+            "in_flight": self._in_flight,
+            "timeouts": self.timeouts.value,
+            "overloads": self.overloads.value,
+            "coalesced": self._flights.coalesced.value,
+            "context_cache": self._cached_content.name if self._cached_content else None,
+            "tokens": {
+                "prompt": self.prompt_tokens.value,
+                "cached": self.cached_tokens.value,
+                "output": self.output_tokens.value
+            },
+            "truncations": self.truncations.value,
+            "hedging": {
+                "enabled": self.hedge_enabled,
+                "delay_ms": round(self._hedge_delay() * 1000, 1),
+                "hedges": self.hedges.value,
+                "wins": self.hedge_wins.value
+            },
+            "circuit_breaker": self.breaker.get_stats(),
+            "summary_circuit_breaker": self.summary_breaker.get_stats(),
+            "response_cache": (
+                {"enabled": True, **self.response_cache.get_stats()} if self.response_cache else {"enabled": False}
+            )
+        }
 
-gemini_service = GeminiService()
\ No newline at end of file
+gemini_service = GeminiService()
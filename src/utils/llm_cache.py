@@ -0,0 +1,151 @@
+'''
+Response cache for Gemini replies.
+
+Small-talk turns ("hola jessy", "¿cómo estás?", "gracias") repeat constantly.
+Replies are keyed by a hash of the normalized prompt, the system prompt and the
+generation config, so editing the prompt or retuning the model never serves a
+stale answer. A local LRU with per-entry expiry answers first; when REDIS_URL is
+set, a shared Redis tier lets every worker reuse each other's replies.
+'''
+
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import redis.asyncio as redis
+
+from src.utils.metrics import metrics
+
+REDIS_RETRY_SECONDS = 30
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Case- and spacing-insensitive form of a prompt. Question and exclamation
+    marks are kept: "¿Tomé mi medicina?" and "Tomé mi medicina." need
+    different answers. Only a trailing period is dropped.
+    """
+    text = unicodedata.normalize("NFC", text).casefold()
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip(". ").lstrip()
+
+
+class LLMResponseCache:
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        max_prompt_chars: int,
+        redis_url: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # Long prompts are practically unique; only short turns are worth caching
+        self.max_prompt_chars = max_prompt_chars
+
+        # key -> (reply, expires_at), least recently used first
+        self._local: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._redis = None
+        if redis_url:
+            self._redis = redis.from_url(
+                redis_url, decode_responses=True, socket_connect_timeout=0.5, socket_timeout=0.5
+            )
+        # After a Redis failure the tier is skipped for a while instead of
+        # adding a timeout to every turn
+        self._redis_retry_at = 0.0
+
+        self.local_hits = metrics.counter("llm_cache_local_hits", "LLM replies served from the local cache")
+        self.redis_hits = metrics.counter("llm_cache_redis_hits", "LLM replies served from Redis")
+        self.misses = metrics.counter("llm_cache_misses", "LLM cache misses")
+        self.bypasses = metrics.counter("llm_cache_bypasses", "LLM calls that skipped the cache")
+        self.redis_errors = metrics.counter("llm_cache_redis_errors", "Failed Redis cache operations")
+
+    @staticmethod
+    def make_key(prompt: str, system_prompt: str, model: str, config: dict) -> str:
+        payload = json.dumps(
+            {
+                "prompt": normalize_prompt(prompt),
+                "system_prompt": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+                "model": model,
+                "config": config
+            },
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return "llm_cache:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def cacheable(self, prompt: str) -> bool:
+        return bool(normalize_prompt(prompt)) and len(prompt) <= self.max_prompt_chars
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._local.get(key)
+        if entry is not None:
+            reply, expires_at = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(key)
+                self.local_hits.inc()
+                return reply
+            del self._local[key]
+
+        if self._redis_usable():
+            try:
+                reply = await self._redis.get(key)
+            except Exception as e:
+                self._redis_failed("get", e)
+                reply = None
+            if reply is not None:
+                self._store_local(key, reply)
+                self.redis_hits.inc()
+                return reply
+
+        self.misses.inc()
+        return None
+
+    async def put(self, key: str, reply: str):
+        self._store_local(key, reply)
+        if self._redis_usable():
+            try:
+                await self._redis.set(key, reply, ex=max(1, int(self.ttl_seconds)))
+            except Exception as e:
+                self._redis_failed("set", e)
+
+    def _redis_usable(self) -> bool:
+        return self._redis is not None and time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self, operation: str, error: Exception):
+        self.redis_errors.inc()
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+        print(f"LLM cache Redis {operation} failed, using the local cache only for {REDIS_RETRY_SECONDS}s: {str(error)}")
+
+    def _store_local(self, key: str, reply: str):
+        self._local[key] = (reply, time.monotonic() + self.ttl_seconds)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def record_bypass(self):
+        self.bypasses.inc()
+
+    async def close(self):
+        if self._redis:
+            await self._redis.aclose()
+
+    def get_stats(self) -> dict:
+        hits = self.local_hits.value + self.redis_hits.value
+        lookups = hits + self.misses.value
+        return {
+            "entries": len(self._local),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "redis": self._redis is not None,
+            "local_hits": self.local_hits.value,
+            "redis_hits": self.redis_hits.value,
+            "misses": self.misses.value,
+            "bypasses": self.bypasses.value,
+            "redis_errors": self.redis_errors.value,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None
+        }
@@ -0,0 +1,214 @@
+'''
+In-process Piper voice running on ONNX Runtime (CPU).
+
+Loads the same `.onnx` voice and `.onnx.json` config the Piper executable uses,
+phonemizes with espeak-ng through `piper_phonemize` and runs inference inside
+the Python process, so no subprocess or intermediate files are involved.
+'''
+
+import asyncio
+import io
+import json
+import threading
+import unicodedata
+import wave
+from pathlib import Path
+from typing import List, Optional
+
+from src.utils.tts_batcher import TTSBatchScheduler
+
+try:
+    import numpy as np
+    import onnxruntime
+except ImportError:
+    np = None
+    onnxruntime = None
+
+try:
+    from piper_phonemize import phonemize_espeak
+except ImportError:
+    phonemize_espeak = None
+
+PAD = "_"
+BOS = "^"
+EOS = "$"
+
+
+class OnnxTTSEngine:
+    def __init__(
+        self,
+        model_path: Path,
+        config_path: Path,
+        espeak_data_path: Optional[Path] = None,
+        batch_window_ms: float = 0.0,
+        max_batch_size: int = 8
+    ):
+        if onnxruntime is None or np is None:
+            raise ImportError("onnxruntime and numpy are required for the ONNX TTS backend")
+
+        self.model_path = model_path
+        self.config_path = config_path
+        self.espeak_data_path = espeak_data_path
+
+        with open(config_path, "r", encoding="utf-8") as config_file:
+            self.config = json.load(config_file)
+
+        self.sample_rate = self.config["audio"]["sample_rate"]
+        self.phoneme_type = self.config.get("phoneme_type", "espeak")
+        self.espeak_voice = self.config.get("espeak", {}).get("voice", "en-us")
+        self.phoneme_id_map = self.config["phoneme_id_map"]
+        self.num_speakers = self.config.get("num_speakers", 1)
+
+        inference = self.config.get("inference", {})
+        self.noise_scale = inference.get("noise_scale", 0.667)
+        self.length_scale = inference.get("length_scale", 1.0)
+        self.noise_w = inference.get("noise_w", 0.8)
+
+        if self.phoneme_type == "espeak" and phonemize_espeak is None:
+            raise ImportError("piper-phonemize is required to phonemize text for this voice")
+        # espeak-ng keeps global state and is not safe to call from several threads
+        self._phonemize_lock = threading.Lock()
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            str(model_path),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.requests_served = 0
+
+        # A zero window disables batching and every request runs on its own
+        self.batcher: Optional[TTSBatchScheduler] = None
+        if batch_window_ms > 0 and max_batch_size > 1:
+            self.batcher = TTSBatchScheduler(self.infer_batch, batch_window_ms, max_batch_size)
+
+    async def start(self):
+        if self.batcher:
+            self.batcher.start()
+
+    async def close(self):
+        if self.batcher:
+            await self.batcher.close()
+
+    def phonemize(self, text: str) -> List[List[str]]:
+        """Split text into sentences of phonemes."""
+        if self.phoneme_type == "text":
+            return [list(unicodedata.normalize("NFD", text))]
+
+        with self._phonemize_lock:
+            if self.espeak_data_path:
+                return phonemize_espeak(text, self.espeak_voice, data_path=str(self.espeak_data_path))
+            return phonemize_espeak(text, self.espeak_voice)
+
+    def phonemes_to_ids(self, phonemes: List[str]) -> List[int]:
+        ids = list(self.phoneme_id_map[BOS])
+        for phoneme in phonemes:
+            if phoneme not in self.phoneme_id_map:
+                continue
+            ids.extend(self.phoneme_id_map[phoneme])
+            ids.extend(self.phoneme_id_map[PAD])
+        ids.extend(self.phoneme_id_map[EOS])
+        return ids
+
+    def _infer(self, phoneme_ids: List[int]):
+        inputs = {
+            "input": np.expand_dims(np.array(phoneme_ids, dtype=np.int64), 0),
+            "input_lengths": np.array([len(phoneme_ids)], dtype=np.int64),
+            "scales": np.array([self.noise_scale, self.length_scale, self.noise_w], dtype=np.float32)
+        }
+        if self.num_speakers > 1:
+            inputs["sid"] = np.array([0], dtype=np.int64)
+
+        audio = self.session.run(None, inputs)[0]
+        return audio.squeeze()
+
+    def infer_batch(self, batch_ids: List[List[int]]) -> List[bytes]:
+        """Run several phoneme sequences through one padded inference (blocking)."""
+        if len(batch_ids) == 1:
+            return [self.audio_to_pcm(self._infer(batch_ids[0]))]
+
+        pad_id = self.phoneme_id_map[PAD][0]
+        max_length = max(len(ids) for ids in batch_ids)
+        padded = np.full((len(batch_ids), max_length), pad_id, dtype=np.int64)
+        for row, ids in enumerate(batch_ids):
+            padded[row, :len(ids)] = ids
+
+        inputs = {
+            "input": padded,
+            "input_lengths": np.array([len(ids) for ids in batch_ids], dtype=np.int64),
+            "scales": np.array([self.noise_scale, self.length_scale, self.noise_w], dtype=np.float32)
+        }
+        if self.num_speakers > 1:
+            inputs["sid"] = np.zeros(len(batch_ids), dtype=np.int64)
+
+        # Output is [batch, 1, samples], padded to the longest utterance
+        audio = self.session.run(None, inputs)[0]
+        return [self.audio_to_pcm(self._trim_padding(audio[row].squeeze())) for row in range(len(batch_ids))]
+
+    def _trim_padding(self, audio):
+        # The exported voice does not return per-item lengths, so the padded
+        # tail (decoded from masked frames, i.e. near silence) is cut at the
+        # last sample above the noise floor plus a short natural release.
+        if audio.size == 0:
+            return audio
+        magnitude = np.abs(audio)
+        threshold = max(1e-4, float(magnitude.max()) * 0.01)
+        voiced = np.nonzero(magnitude > threshold)[0]
+        if voiced.size == 0:
+            return audio[:0]
+        release = int(self.sample_rate * 0.05)
+        return audio[:min(audio.size, voiced[-1] + 1 + release)]
+
+    @staticmethod
+    def audio_to_pcm(audio) -> bytes:
+        """Normalize float audio to 16-bit little-endian PCM."""
+        peak = max(0.01, float(np.max(np.abs(audio)))) if audio.size else 0.01
+        scaled = audio * (32767.0 / peak)
+        return np.clip(scaled, -32768, 32767).astype("<i2").tobytes()
+
+    def synthesize_pcm(self, text: str) -> bytes:
+        """Synthesize text to raw 16-bit mono PCM at `sample_rate` (blocking)."""
+        return b"".join(self.audio_to_pcm(self._infer(ids)) for ids in self.sentence_ids(text))
+
+    def pcm_to_wav(self, pcm: bytes) -> bytes:
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(pcm)
+        return buffer.getvalue()
+
+    def sentence_ids(self, text: str) -> List[List[int]]:
+        return [self.phonemes_to_ids(phonemes) for phonemes in self.phonemize(text) if phonemes]
+
+    async def synthesize(self, text: str, output_path: Optional[Path] = None) -> bytes:
+        """WAV audio for text, also written to output_path when one is given."""
+        # onnxruntime releases the GIL while running, so inference in the
+        # default executor leaves the event loop free for other requests.
+        loop = asyncio.get_running_loop()
+        if self.batcher:
+            sentence_ids = await loop.run_in_executor(None, self.sentence_ids, text)
+            chunks = await asyncio.gather(*(self.batcher.submit(ids) for ids in sentence_ids))
+            pcm = b"".join(chunks)
+        else:
+            pcm = await loop.run_in_executor(None, self.synthesize_pcm, text)
+        wav_data = self.pcm_to_wav(pcm)
+        if output_path is not None:
+            await loop.run_in_executor(None, output_path.write_bytes, wav_data)
+        self.requests_served += 1
+        return wav_data
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": "onnx",
+            "model": self.model_path.name,
+            "sample_rate": self.sample_rate,
+            "requests_served": self.requests_served,
+            "batching": {
+                "enabled": self.batcher is not None,
+                "window_ms": self.batcher.window * 1000 if self.batcher else 0,
+                "max_batch_size": self.batcher.max_batch_size if self.batcher else 1
+            }
+        }
@@ -0,0 +1,141 @@
+'''
+Pre-synthesized phrase bank.
+
+Recurring replies (greetings, clarifying questions, fallbacks, emergency
+acknowledgements) are synthesized, or pulled from the TTS disk cache, once at
+startup and kept in memory. A reply that matches a bank phrase exactly or after
+normalization is answered from memory without touching the TTS engine or disk.
+'''
+
+import asyncio
+import json
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.constants.phrases import phrase_bank as default_phrases
+from src.utils.metrics import metrics
+
+
+def normalize_phrase(text: str) -> str:
+    """Case-, spacing- and punctuation-insensitive form used for matching."""
+    text = unicodedata.normalize("NFC", text).casefold()
+    text = re.sub(r"[^\w\s]", "", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class PhraseBank:
+    def __init__(
+        self,
+        synthesize: Callable[[str, str], Awaitable[Optional[dict]]],
+        phrases_file: Optional[Path] = None,
+        formats: Optional[List[str]] = None,
+        reload_interval: float = 30.0
+    ):
+        # synthesize(text, voice_format) returns a text_to_speech-style result
+        self.synthesize = synthesize
+        self.phrases_file = phrases_file
+        self.formats = formats or ["wav"]
+        self.reload_interval = reload_interval
+
+        # Phrases added by other services, e.g. configurable canned replies
+        self._registered: List[str] = []
+        self._exact: Dict[Tuple[str, str], dict] = {}
+        self._normalized: Dict[Tuple[str, str], dict] = {}
+        self._phrases_mtime: Optional[float] = None
+        self._load_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+        self.ready = False
+
+        self.served = metrics.counter("phrase_bank_served", "Voice replies served from the phrase bank")
+        self.reloads = metrics.counter("phrase_bank_reloads", "Phrase bank (re)loads")
+
+    def _read_phrases(self) -> List[str]:
+        phrases = list(default_phrases) + self._registered
+        if self.phrases_file and self.phrases_file.exists():
+            with open(self.phrases_file, "r", encoding="utf-8") as phrases_handle:
+                extra = json.load(phrases_handle)
+            if not isinstance(extra, list) or not all(isinstance(phrase, str) for phrase in extra):
+                raise ValueError(f"{self.phrases_file} must contain a JSON list of strings")
+            phrases.extend(extra)
+            self._phrases_mtime = os.path.getmtime(self.phrases_file)
+        # Keep order, drop duplicates
+        return list(dict.fromkeys(phrase.strip() for phrase in phrases if phrase.strip()))
+
+    async def load(self) -> int:
+        """(Re)build the bank; the previous entries keep serving until the swap."""
+        async with self._load_lock:
+            loop = asyncio.get_running_loop()
+            phrases = await loop.run_in_executor(None, self._read_phrases)
+
+            exact = {}
+            normalized = {}
+            for phrase in phrases:
+                for voice_format in self.formats:
+                    result = await self.synthesize(phrase, voice_format)
+                    if not result:
+                        print(f"Phrase bank: could not synthesize '{phrase}' ({voice_format})")
+                        continue
+                    exact[(phrase, voice_format)] = result
+                    normalized.setdefault((normalize_phrase(phrase), voice_format), result)
+
+            self._exact = exact
+            self._normalized = normalized
+            self.ready = True
+            self.reloads.inc()
+            print(f"Phrase bank loaded {len(exact)} clip(s) for {len(phrases)} phrase(s)")
+            return len(exact)
+
+    def register(self, phrases: List[str]):
+        """Include phrases in every (re)load from now on."""
+        self._registered.extend(phrase for phrase in phrases if phrase not in self._registered)
+
+    def lookup(self, text: str, voice_format: str) -> Optional[dict]:
+        result = self._exact.get((text.strip(), voice_format))
+        if result is None:
+            result = self._normalized.get((normalize_phrase(text), voice_format))
+        if result is not None:
+            self.served.inc()
+        return result
+
+    def start(self):
+        """Warm the bank in the background and watch the phrases file for changes."""
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _run(self):
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"Phrase bank failed to load: {str(e)}")
+
+        if not self.phrases_file:
+            return
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                if self.phrases_file.exists() and os.path.getmtime(self.phrases_file) != self._phrases_mtime:
+                    await self.load()
+            except Exception as e:
+                print(f"Phrase bank reload failed: {str(e)}")
+
+    def get_stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "clips": len(self._exact),
+            "formats": self.formats,
+            "phrases_file": str(self.phrases_file) if self.phrases_file else None,
+            "served": self.served.value,
+            "reloads": self.reloads.value
+        }
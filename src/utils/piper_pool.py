@@ -0,0 +1,234 @@
+'''
+Pool of long-lived Piper processes.
+
+Each worker runs Piper in JSON-input mode so the voice model is loaded once and
+every utterance is a single line written to its stdin. Piper answers with the
+path of the WAV it wrote on stdout, which is how we know a request finished.
+'''
+
+import asyncio
+import json
+import time
+from collections import deque
+from pathlib import Path
+from typing import List, Optional
+
+
+class PiperWorkerError(Exception):
+    """Raised when a Piper worker fails to synthesize a request."""
+
+
+class PiperWorker:
+    def __init__(self, worker_id: int, command: List[str], cwd: str):
+        self.worker_id = worker_id
+        self.command = command
+        self.cwd = cwd
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.busy = False
+        self.requests_served = 0
+        self.restarts = 0
+        self.started_at: Optional[float] = None
+        self._stderr_tail = deque(maxlen=20)
+        self._stderr_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self.cwd
+        )
+        self.started_at = time.monotonic()
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+
+    async def _drain_stderr(self):
+        # Piper logs to stderr; it has to be consumed or the pipe fills up and
+        # the worker stalls mid-utterance.
+        try:
+            while self.process and self.process.stderr:
+                line = await self.process.stderr.readline()
+                if not line:
+                    break
+                self._stderr_tail.append(line.decode("utf-8", errors="replace").rstrip())
+        except asyncio.CancelledError:
+            pass
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def last_errors(self) -> str:
+        return "\n".join(self._stderr_tail)
+
+    async def synthesize(self, text: str, output_path: Path, timeout: float):
+        if not self.is_alive():
+            raise PiperWorkerError(f"Piper worker {self.worker_id} is not running")
+
+        request_line = json.dumps({"text": text, "output_file": str(output_path)}) + "\n"
+        self.process.stdin.write(request_line.encode("utf-8"))
+        await self.process.stdin.drain()
+
+        line = await asyncio.wait_for(self.process.stdout.readline(), timeout=timeout)
+        if not line:
+            raise PiperWorkerError(
+                f"Piper worker {self.worker_id} exited unexpectedly: {self.last_errors()}"
+            )
+
+        written_path = line.decode("utf-8", errors="replace").strip()
+        if Path(written_path) != Path(output_path):
+            raise PiperWorkerError(
+                f"Piper worker {self.worker_id} returned unexpected output: {written_path}"
+            )
+        self.requests_served += 1
+
+    async def stop(self):
+        if self.process and self.process.returncode is None:
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), timeout=5)
+            except (asyncio.TimeoutError, ProcessLookupError, BrokenPipeError, ConnectionResetError):
+                try:
+                    self.process.kill()
+                    await self.process.wait()
+                except ProcessLookupError:
+                    pass
+        if self._stderr_task:
+            self._stderr_task.cancel()
+            self._stderr_task = None
+
+    async def restart(self):
+        await self.stop()
+        self.restarts += 1
+        await self.start()
+
+
+class PiperWorkerPool:
+    def __init__(
+        self,
+        command: List[str],
+        cwd: str,
+        size: int = 2,
+        request_timeout: float = 30.0,
+        health_check_interval: float = 10.0
+    ):
+        self.command = command
+        self.cwd = cwd
+        self.size = max(1, size)
+        self.request_timeout = request_timeout
+        self.health_check_interval = health_check_interval
+
+        self.workers: List[PiperWorker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+        self._started = False
+        # Set by close(); stops lazy starts, restarts and requeueing for good
+        self._closed = False
+
+    async def start(self):
+        async with self._start_lock:
+            if self._closed:
+                raise PiperWorkerError("Piper worker pool is closed")
+            if self._started:
+                return
+            self._idle = asyncio.Queue()
+            try:
+                for worker_id in range(self.size):
+                    worker = PiperWorker(worker_id, self.command, self.cwd)
+                    await worker.start()
+                    self.workers.append(worker)
+                    self._idle.put_nowait(worker)
+            except Exception:
+                for worker in self.workers:
+                    await worker.stop()
+                self.workers = []
+                raise
+            self._health_task = asyncio.create_task(self._health_check_loop())
+            self._started = True
+            print(f"Piper worker pool started with {self.size} worker(s)")
+
+    async def synthesize(self, text: str, output_path: Path) -> bytes:
+        if not self._started:
+            await self.start()
+
+        worker = await self._idle.get()
+        if worker is None or self._closed:
+            # close() wakes waiters with None; pass it on to the next one
+            self._idle.put_nowait(None)
+            raise PiperWorkerError("Piper worker pool is closed")
+        worker.busy = True
+        try:
+            if not worker.is_alive():
+                print(f"Piper worker {worker.worker_id} found dead, restarting")
+                await worker.restart()
+            await worker.synthesize(text, output_path, self.request_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError, PiperWorkerError, OSError) as e:
+            # A half-finished request leaves the worker's pipes out of sync, so
+            # it is always replaced rather than handed to the next caller.
+            print(f"Piper worker {worker.worker_id} failed ({type(e).__name__}), restarting")
+            await self._safe_restart(worker)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            if isinstance(e, asyncio.TimeoutError):
+                raise PiperWorkerError(f"Piper synthesis timed out after {self.request_timeout}s")
+            raise PiperWorkerError(str(e)) from e
+        finally:
+            worker.busy = False
+            if not self._closed:
+                self._idle.put_nowait(worker)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, output_path.read_bytes)
+
+    async def _safe_restart(self, worker: PiperWorker):
+        if self._closed:
+            return
+        try:
+            await worker.restart()
+        except Exception as e:
+            print(f"Could not restart Piper worker {worker.worker_id}: {str(e)}")
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for worker in self.workers:
+                # Busy workers are checked by the request that holds them.
+                if not worker.busy and not worker.is_alive():
+                    print(
+                        f"Piper worker {worker.worker_id} exited with code "
+                        f"{worker.process.returncode if worker.process else None}, restarting"
+                    )
+                    await self._safe_restart(worker)
+
+    async def close(self):
+        self._closed = True
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        if self._idle:
+            self._idle.put_nowait(None)
+        for worker in self.workers:
+            await worker.stop()
+        self.workers = []
+        self._started = False
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": "piper",
+            "size": self.size,
+            "started": self._started,
+            "idle_workers": self._idle.qsize() if self._idle else 0,
+            "workers": [
+                {
+                    "id": worker.worker_id,
+                    "alive": worker.is_alive(),
+                    "requests_served": worker.requests_served,
+                    "restarts": worker.restarts
+                }
+                for worker in self.workers
+            ]
+        }
@@ -1,102 +1,527 @@
 import os
-import subprocess
-import tempfile
+import asyncio
+import json
 import base64
+import io
 import uuid
+import wave
 import datetime
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+from src.utils.piper_pool import PiperWorkerPool
+from src.utils.onnx_tts_engine import OnnxTTSEngine
+from src.utils.tts_cache import TTSAudioCache
+from src.utils.audio_encoder import audio_encoder
+from src.utils.voice_store import VoiceFileStore
+from src.utils.phrase_bank import PhraseBank
+from src.utils.response_budget import ends_sentence, truncate_to_sentence
+from src.utils.single_flight import SingleFlight
+from src.utils.text_segmentation import SentenceStream
 
 class PiperTTSService:
     def __init__(self):
         self.project_root = Path(__file__).parent.parent.parent
         self.piper_dir = self.project_root / "piper"
         self.voice_dir = self.piper_dir / "voice"
-        self.piper_exe = self.piper_dir / "piper.exe"
+        self.piper_exe = Path(os.getenv(
+            "PIPER_EXECUTABLE",
+            str(self.piper_dir / ("piper.exe" if os.name == "nt" else "piper"))
+        ))
         self.model_path = self.piper_dir / "en_US-bryce-medium.onnx"
+        self.config_path = self.piper_dir / "en_US-bryce-medium.onnx.json"
+        self.espeak_data_path = self.piper_dir / "espeak-ng-data"
         
         self.voice_dir.mkdir(exist_ok=True)
-        
-        if not self.piper_exe.exists():
-            print(f"Piper executable not found at {self.piper_exe}")
-            print(f"Current piper directory contents: {list(self.piper_dir.iterdir()) if self.piper_dir.exists() else 'Directory does not exist'}")
-            raise FileNotFoundError(f"Piper executable not found at {self.piper_exe}")
+        # Phrase bank clips live apart from the retention-swept voice files
+        self.phrase_dir = self.voice_dir / "phrases"
+        self.phrase_dir.mkdir(exist_ok=True)
         
         if not self.model_path.exists():
             print(f"Piper model not found at {self.model_path}")
             print(f"Available files in piper directory: {list(self.piper_dir.glob('*.onnx'))}")
             raise FileNotFoundError(f"Piper model not found at {self.model_path}")
+        
+        # "piper" runs the Piper executable, "onnx" runs the voice in-process,
+        # "auto" prefers the executable when one is usable on this platform.
+        self.backend = os.getenv("TTS_BACKEND", "auto").lower()
+        if self.backend == "auto":
+            self.backend = "piper" if self._piper_exe_usable() else "onnx"
+        
+        if self.backend == "piper":
+            if not self.piper_exe.exists():
+                print(f"Piper executable not found at {self.piper_exe}")
+                print(f"Current piper directory contents: {list(self.piper_dir.iterdir()) if self.piper_dir.exists() else 'Directory does not exist'}")
+                raise FileNotFoundError(f"Piper executable not found at {self.piper_exe}")
+            
+            # Long-lived Piper processes keep the voice model loaded between replies
+            self.engine = PiperWorkerPool(
+                command=[
+                    str(self.piper_exe),
+                    "--model", str(self.model_path),
+                    "--json-input",
+                    "--output_dir", str(self.voice_dir)
+                ],
+                cwd=str(self.piper_dir),
+                size=int(os.getenv("PIPER_POOL_SIZE", "2")),
+                request_timeout=float(os.getenv("PIPER_REQUEST_TIMEOUT", "30")),
+                health_check_interval=float(os.getenv("PIPER_HEALTH_CHECK_INTERVAL", "10"))
+            )
+        elif self.backend == "onnx":
+            if not self.config_path.exists():
+                raise FileNotFoundError(f"Piper model config not found at {self.config_path}")
+            
+            self.engine = OnnxTTSEngine(
+                self.model_path,
+                self.config_path,
+                self.espeak_data_path if self.espeak_data_path.exists() else None,
+                batch_window_ms=float(os.getenv("TTS_BATCH_WINDOW_MS", "10")),
+                max_batch_size=int(os.getenv("TTS_BATCH_MAX_SIZE", "8"))
+            )
+        else:
+            raise ValueError(f"Unknown TTS_BACKEND '{self.backend}'. Use 'auto', 'piper' or 'onnx'")
+        
+        # Synthesis parameters are part of the cache key so retuning the voice
+        # never serves stale audio
+        self.synthesis_params = {}
+        self.sample_rate = 22050
+        if self.config_path.exists():
+            with open(self.config_path, "r", encoding="utf-8") as config_file:
+                voice_config = json.load(config_file)
+            self.synthesis_params = voice_config.get("inference", {})
+            self.sample_rate = voice_config.get("audio", {}).get("sample_rate", self.sample_rate)
+        
+        self.voice_store = VoiceFileStore(
+            self.voice_dir,
+            max_age_seconds=float(os.getenv("VOICE_RETENTION_MAX_AGE_HOURS", "24")) * 3600,
+            max_total_bytes=int(float(os.getenv("VOICE_RETENTION_MAX_MB", "512")) * 1024 * 1024),
+            sweep_interval=float(os.getenv("VOICE_RETENTION_SWEEP_SECONDS", "300"))
+        )
+        
+        self._flights = SingleFlight("tts")
+        
+        self.audio_cache = None
+        if os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true":
+            self.audio_cache = TTSAudioCache(
+                self.voice_dir / "cache",
+                memory_max_bytes=int(float(os.getenv("TTS_CACHE_MEMORY_MB", "32")) * 1024 * 1024),
+                disk_max_bytes=int(float(os.getenv("TTS_CACHE_DISK_MB", "256")) * 1024 * 1024)
+            )
+        
+        # Recurring replies are synthesized once at startup and served from memory
+        self.phrase_bank = None
+        if os.getenv("PHRASE_BANK_ENABLED", "true").lower() == "true":
+            phrases_file = os.getenv("PHRASE_BANK_FILE")
+            self.phrase_bank = PhraseBank(
+                self._phrase_audio,
+                phrases_file=Path(phrases_file) if phrases_file else None,
+                formats=[fmt.strip() for fmt in os.getenv("PHRASE_BANK_FORMATS", "wav").split(",") if fmt.strip()],
+                reload_interval=float(os.getenv("PHRASE_BANK_RELOAD_SECONDS", "30"))
+            )
+    
+    def _piper_exe_usable(self) -> bool:
+        if not self.piper_exe.exists():
+            return False
+        # piper.exe and its DLLs only run on Windows
+        if self.piper_exe.suffix.lower() == ".exe":
+            return os.name == "nt"
+        return os.access(self.piper_exe, os.X_OK)
     
-    async def text_to_speech(self, text: str, output_format: str = "wav") -> Optional[dict]:
+    async def startup(self):
+        self.voice_store.start()
+        await self.engine.start()
+        if self.phrase_bank:
+            self.phrase_bank.start()
+    
+    async def shutdown(self):
+        if self.phrase_bank:
+            await self.phrase_bank.close()
+        await self.voice_store.close()
+        await self.engine.close()
+    
+    def cache_key(self, text: str, output_format: str) -> str:
+        return TTSAudioCache.make_key(text, self.model_path.name, output_format, self.synthesis_params)
+    
+    def _build_result(self, audio_data: bytes, file_path: Optional[Path], cached: bool, encode_base64: bool) -> dict:
+        return {
+            "audio_bytes": audio_data,
+            "audio_base64": base64.b64encode(audio_data).decode('utf-8') if encode_base64 else None,
+            "file_path": str(file_path) if file_path else None,
+            "filename": file_path.name if file_path else None,
+            "file_size": len(audio_data),
+            "cached": cached
+        }
+    
+    async def text_to_speech(self, text: str, output_format: str = "wav", encode_base64: bool = True) -> Optional[dict]:
+        """
+        Synthesize text and return the audio with its file details.
+        Callers that send the audio as binary pass encode_base64=False to skip the base64 copy.
+        """
+        banked = self._banked(text, output_format, encode_base64)
+        if banked is not None:
+            return banked
+        
+        # Identical requests already in flight share one synthesis; each caller
+        # gets its own copy of the result dict
+        result = await self._flights.do(
+            f"{self.cache_key(text, output_format)}:{int(encode_base64)}",
+            lambda: self._synthesize(text, output_format, encode_base64)
+        )
+        return dict(result) if result else result
+    
+    def _banked(self, text: str, output_format: str, encode_base64: bool) -> Optional[dict]:
+        if not self.phrase_bank:
+            return None
+        banked = self.phrase_bank.lookup(text, output_format)
+        if banked is None:
+            return None
+        return {**banked, "audio_base64": banked["audio_base64"] if encode_base64 else None}
+    
+    async def _cached(self, text: str, output_format: str, encode_base64: bool) -> Optional[dict]:
+        if not self.audio_cache:
+            return None
+        cache_key = self.cache_key(text, output_format)
+        cached_audio = await self.audio_cache.get(cache_key)
+        if cached_audio is None:
+            return None
+        return self._build_result(cached_audio, self.audio_cache.disk_path(cache_key), True, encode_base64)
+    
+    async def _stored_audio(self, text: str, output_format: str, encode_base64: bool) -> Optional[dict]:
+        """Audio for the whole text from the phrase bank or the TTS cache, without synthesizing."""
+        banked = self._banked(text, output_format, encode_base64)
+        if banked is not None:
+            return banked
+        return await self._cached(text, output_format, encode_base64)
+    
+    async def _phrase_audio(self, text: str, output_format: str) -> Optional[dict]:
+        """
+        Audio for a phrase bank clip, kept in phrase_dir where neither the
+        retention sweeper nor cache eviction removes it. Clips are named by
+        cache key, so reloading the bank reuses them instead of resynthesizing.
+        """
+        cache_key = self.cache_key(text, output_format)
+        clip_path = self.phrase_dir / f"{cache_key}.{output_format}"
+        loop = asyncio.get_running_loop()
         try:
+            if clip_path.is_file():
+                audio_data = await loop.run_in_executor(None, clip_path.read_bytes)
+            else:
+                audio_data = await self.audio_cache.get(cache_key) if self.audio_cache else None
+                if audio_data is None:
+                    audio_data = await self._engine_wav(text)
+                    if audio_data and output_format != "wav":
+                        audio_data = await audio_encoder.encode(audio_data, output_format)
+                if not audio_data:
+                    return None
+                await loop.run_in_executor(None, self._write_file, clip_path, audio_data)
+        except Exception as e:
+            print(f"Error synthesizing phrase bank clip: {str(e)}")
+            return None
+        return self._build_result(audio_data, clip_path, True, True)
+    
+    async def _synthesize(self, text: str, output_format: str, encode_base64: bool) -> Optional[dict]:
+        try:
+            cached = await self._cached(text, output_format, encode_base64)
+            if cached is not None:
+                return cached
+            
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             unique_id = str(uuid.uuid4())[:8]
-            filename = f"voice_{timestamp}_{unique_id}.{output_format}"
-            audio_file_path = self.voice_dir / filename
+            audio_file_path = self.voice_dir / f"voice_{timestamp}_{unique_id}.{output_format}"
             
-            cmd = [
-                str(self.piper_exe),
-                "--model", str(self.model_path),
-                "--output_file", str(audio_file_path)
-            ]
+            # Both engines produce WAV. The engine writes it straight to the voice
+            # file only when WAV was asked for; other formats are encoded from
+            # memory and only the encoded file is written.
+            is_wav = output_format == "wav"
+            audio_data = await self._engine_wav(text, audio_file_path if is_wav else None)
             
-            process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=str(self.piper_dir)
-            )
+            if not audio_data:
+                print(f"No audio was produced for {audio_file_path}")
+                return None
             
-            stdout, stderr = process.communicate(input=text)
+            if not is_wav:
+                audio_data = await audio_encoder.encode(audio_data, output_format)
+                await asyncio.get_running_loop().run_in_executor(None, audio_file_path.write_bytes, audio_data)
             
-            if process.returncode != 0:
-                print(f"Piper TTS error (return code {process.returncode}): {stderr}")
-                print(f"Piper stdout: {stdout}")
-                print(f"Command used: {' '.join(cmd)}")
-                return None
+            self.voice_store.register(audio_file_path, len(audio_data))
             
-            if audio_file_path.exists():
-                with open(audio_file_path, "rb") as audio_file:
-                    audio_data = audio_file.read()
-                    audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                
-                return {
-                    "audio_base64": audio_base64,
-                    "file_path": str(audio_file_path),
-                    "filename": filename,
-                    "file_size": len(audio_data)
-                }
-            else:
-                print(f"Audio file was not created at {audio_file_path}")
-                return None
+            if self.audio_cache:
+                await self.audio_cache.put(self.cache_key(text, output_format), audio_data, output_format)
+            
+            return self._build_result(audio_data, audio_file_path, False, encode_base64)
                 
         except Exception as e:
             print(f"Error in text_to_speech: {str(e)}")
             return None
     
+    async def _engine_wav(self, text: str, output_path: Optional[Path] = None) -> bytes:
+        """WAV from the TTS engine, written to disk only when output_path is given."""
+        if output_path is not None or self.backend != "piper":
+            return await self.engine.synthesize(text, output_path)
+        
+        # The Piper subprocess can only hand audio back through a file
+        scratch_path = self.voice_dir / f"part_{uuid.uuid4().hex}.wav"
+        try:
+            return await self.engine.synthesize(text, scratch_path)
+        finally:
+            await asyncio.get_running_loop().run_in_executor(None, self._remove_file, scratch_path)
+    
+    async def _sentence_pcm(self, sentence: str) -> bytes:
+        """Raw PCM for one sentence of a streamed reply, reusing banked or cached audio."""
+        wav_audio = None
+        banked = self.phrase_bank.lookup(sentence, "wav") if self.phrase_bank else None
+        if banked is not None:
+            wav_audio = banked["audio_bytes"]
+        
+        cache_key = None
+        if wav_audio is None and self.audio_cache:
+            cache_key = self.cache_key(sentence, "wav")
+            wav_audio = await self.audio_cache.get(cache_key)
+        
+        if wav_audio is None:
+            wav_audio = await self._engine_wav(sentence)
+            if not wav_audio:
+                raise RuntimeError(f"No audio was produced for sentence '{sentence}'")
+            if cache_key:
+                await self.audio_cache.put(cache_key, wav_audio, "wav")
+        
+        with wave.open(io.BytesIO(wav_audio), "rb") as wav_file:
+            return wav_file.readframes(wav_file.getnframes())
+    
+    async def stream_to_speech(
+        self,
+        text_chunks: AsyncIterator[str],
+        output_format: str = "wav",
+        encode_base64: bool = True,
+        drop_incomplete_tail: Optional[Callable[[], bool]] = None
+    ) -> Tuple[str, Optional[dict]]:
+        """
+        Synthesize a reply while it is still being generated. Each sentence goes
+        to TTS as soon as it is complete, so generation and synthesis overlap;
+        the sentence audio is joined (and encoded) in order into one voice file.
+        Audio already stored for the whole reply (phrase bank or TTS cache) is
+        reused: a reply that arrives in one chunk, such as an LLM cache hit, is
+        looked up before any sentence is synthesized, a streamed one before its
+        voice file is written.
+        drop_incomplete_tail is checked once the text ends; when it returns True
+        (e.g. the LLM hit its token cap) a trailing unfinished sentence is not spoken.
+        Returns the spoken text and the text_to_speech-style result.
+        """
+        splitter = SentenceStream()
+        sentence_tasks: List[asyncio.Task] = []
+        text_parts = []
+        audio_started = asyncio.Event()
+        text_done = asyncio.Event()
+        
+        audio_failed = False
+        truncated = False
+        stored_result = None
+        
+        def queue_sentences(sentences: List[str]):
+            # Once synthesis has failed the rest of the text is only collected
+            if audio_failed:
+                return
+            for sentence in sentences:
+                sentence_tasks.append(asyncio.create_task(self._sentence_pcm(sentence)))
+                audio_started.set()
+        
+        async def consume_text():
+            nonlocal truncated, stored_result
+            try:
+                chunks = text_chunks.__aiter__()
+                chunk = await self._next_chunk(chunks)
+                if chunk is not None:
+                    text_parts.append(chunk)
+                    following = await self._next_chunk(chunks)
+                    if following is None:
+                        stored_result = await self._stored_audio(chunk.strip(), output_format, encode_base64)
+                        if stored_result is not None:
+                            return
+                    queue_sentences(splitter.feed(chunk))
+                    while following is not None:
+                        text_parts.append(following)
+                        queue_sentences(splitter.feed(following))
+                        following = await self._next_chunk(chunks)
+                remainder = splitter.flush()
+                if (
+                    remainder and (sentence_tasks or len(remainder) > 1)
+                    and drop_incomplete_tail and drop_incomplete_tail()
+                    and not ends_sentence(remainder[-1])
+                ):
+                    remainder = remainder[:-1]
+                    truncated = True
+                queue_sentences(remainder)
+            finally:
+                text_done.set()
+                audio_started.set()
+        
+        async def pcm_chunks() -> AsyncIterator[bytes]:
+            index = 0
+            while True:
+                if index < len(sentence_tasks):
+                    yield await sentence_tasks[index]
+                    index += 1
+                elif text_done.is_set():
+                    return
+                else:
+                    audio_started.clear()
+                    await audio_started.wait()
+        
+        consumer = asyncio.create_task(consume_text())
+        try:
+            try:
+                # Nothing is encoded until a sentence is queued, so a stored or
+                # empty reply never starts an encoder
+                await audio_started.wait()
+                if not sentence_tasks:
+                    audio_data = b""
+                elif output_format == "wav":
+                    pcm = b"".join([chunk async for chunk in pcm_chunks()])
+                    audio_data = self._pcm_to_wav(pcm) if pcm else b""
+                else:
+                    audio_data = b"".join([
+                        chunk async for chunk in audio_encoder.encode_stream(
+                            pcm_chunks(), output_format, input_format="pcm", sample_rate=self.sample_rate
+                        )
+                    ])
+            except Exception as e:
+                # Like text_to_speech, a synthesis failure leaves a text-only reply
+                print(f"Error in stream_to_speech: {str(e)}")
+                audio_failed = True
+                audio_data = b""
+                for task in sentence_tasks:
+                    task.cancel()
+            # Text errors end the stream early and are raised to the caller
+            await consumer
+        finally:
+            if not consumer.done():
+                consumer.cancel()
+            for task in sentence_tasks:
+                if not task.done():
+                    task.cancel()
+        
+        text = "".join(text_parts).strip()
+        if truncated:
+            text = truncate_to_sentence(text)
+        if stored_result is not None:
+            return text, stored_result
+        if not audio_data:
+            return text, None
+        
+        # A repeated reply keeps its existing file instead of writing another
+        stored_result = await self._stored_audio(text, output_format, encode_base64)
+        if stored_result is not None:
+            return text, stored_result
+        
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        unique_id = str(uuid.uuid4())[:8]
+        audio_file_path = self.voice_dir / f"voice_{timestamp}_{unique_id}.{output_format}"
+        await asyncio.get_running_loop().run_in_executor(None, audio_file_path.write_bytes, audio_data)
+        self.voice_store.register(audio_file_path, len(audio_data))
+        
+        if self.audio_cache:
+            await self.audio_cache.put(self.cache_key(text, output_format), audio_data, output_format)
+        
+        return text, self._build_result(audio_data, audio_file_path, False, encode_base64)
+    
+    @staticmethod
+    async def _next_chunk(chunks: AsyncIterator[str]) -> Optional[str]:
+        try:
+            return await chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+    
+    def _pcm_to_wav(self, pcm: bytes) -> bytes:
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(pcm)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def _write_file(file_path: Path, data: bytes):
+        # Write then rename so a reader never sees a partial clip
+        tmp_path = file_path.with_suffix(file_path.suffix + ".part")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, file_path)
+    
+    @staticmethod
+    def _remove_file(file_path: Path):
+        try:
+            file_path.unlink()
+        except FileNotFoundError:
+            pass
+    
     def is_configured(self) -> bool:
-        return self.piper_exe.exists() and self.model_path.exists()
+        if self.backend == "piper":
+            return self.piper_exe.exists() and self.model_path.exists()
+        return self.model_path.exists() and self.config_path.exists()
+    
+    def get_engine_stats(self) -> dict:
+        return self.engine.get_stats()
+    
+    def get_cache_stats(self) -> dict:
+        if not self.audio_cache:
+            return {"enabled": False, "coalesced": self._flights.coalesced.value}
+        return {"enabled": True, **self.audio_cache.get_stats(), "coalesced": self._flights.coalesced.value}
+    
+    def get_phrase_bank_stats(self) -> dict:
+        if not self.phrase_bank:
+            return {"enabled": False}
+        return {"enabled": True, **self.phrase_bank.get_stats()}
+    
+    def register_phrases(self, phrases: List[str]):
+        """Bank these phrases too; call before startup() so the first load includes them."""
+        if self.phrase_bank:
+            self.phrase_bank.register(phrases)
+    
+    async def reload_phrase_bank(self) -> int:
+        if not self.phrase_bank:
+            raise ValueError("Phrase bank is disabled")
+        return await self.phrase_bank.load()
     
     def get_supported_formats(self) -> list:
-        return ["wav", "mp3", "flac"]
+        return ["wav"] + audio_encoder.get_supported_formats()
     
-    def get_voice_files(self) -> list:
-        try:
-            voice_files = []
-            for file_path in self.voice_dir.glob("*"):
-                if file_path.is_file() and file_path.suffix in [".wav", ".mp3", ".flac"]:
-                    stat = file_path.stat()
-                    voice_files.append({
-                        "filename": file_path.name,
-                        "size": stat.st_size,
-                        "created": datetime.datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                        "path": str(file_path)
-                    })
-            return sorted(voice_files, key=lambda x: x["created"], reverse=True)
-        except Exception as e:
-            print(f"Error getting voice files: {str(e)}")
-            return []
+    def find_voice_file(self, filename: str) -> Optional[dict]:
+        """Locate a generated or cached voice file by name for download."""
+        entry = self.voice_store.get_entry(filename)
+        if entry:
+            file_path, created, file_size = entry
+            if file_path.is_file():
+                return {
+                    "path": file_path,
+                    "size": file_size,
+                    "etag": self.voice_store.etag(created, file_size),
+                    "max_age": int(self.voice_store.max_age_seconds)
+                }
+            self.voice_store.forget(filename)
+        
+        # Phrase bank replies hand out their clip
+        clip_path = self.phrase_dir / filename
+        if Path(filename).name == filename and clip_path.suffix != ".part" and clip_path.is_file():
+            return {
+                "path": clip_path,
+                "size": clip_path.stat().st_size,
+                "etag": f'"{clip_path.stem}"',
+                "max_age": int(self.voice_store.max_age_seconds)
+            }
+        
+        # Cache hits hand out the content-addressed cache file instead
+        if self.audio_cache:
+            cached = self.audio_cache.find_file(filename)
+            if cached and cached[0].is_file():
+                file_path, file_size = cached
+                return {
+                    "path": file_path,
+                    "size": file_size,
+                    "etag": f'"{file_path.stem}"',
+                    "max_age": int(self.voice_store.max_age_seconds)
+                }
+        return None
+    
+    def get_voice_files(self, limit: int = 50, cursor: Optional[str] = None) -> dict:
+        return self.voice_store.list_files(limit=limit, cursor=cursor)
 
 piper_tts_service = PiperTTSService()
\ No newline at end of file
@@ -0,0 +1,48 @@
+'''
+Output-length budgets for Gemini replies.
+
+Spoken replies are meant to be one or two sentences, so voice turns get a small
+token cap and text turns a larger one; a request may set its own cap, up to
+LLM_MAX_TOKENS_CAP. Stop sequences end a generation that starts inventing
+the next dialogue turn, and a reply cut off by the token cap is trimmed back to
+its last complete sentence so TTS never speaks half a sentence.
+'''
+
+import os
+import re
+from typing import Optional
+
+from src.utils.text_segmentation import split_sentences
+
+VOICE_MAX_TOKENS = int(os.getenv("LLM_VOICE_MAX_TOKENS", "120"))
+TEXT_MAX_TOKENS = int(os.getenv("LLM_TEXT_MAX_TOKENS", "400"))
+MAX_TOKENS_CAP = int(os.getenv("LLM_MAX_TOKENS_CAP", "1000"))
+
+# Prompts are laid out as "User: ...\nAssistant:" lines
+STOP_SEQUENCES = ["\nUser:", "\nAssistant:"]
+
+# Terminal punctuation, optionally followed by closing quotes/brackets, at the end
+SENTENCE_CLOSE = re.compile(r"[.!?…][\"'”’»)\]]*$")
+
+
+def max_tokens_for(voice: bool, requested: Optional[int] = None) -> int:
+    default = VOICE_MAX_TOKENS if voice else TEXT_MAX_TOKENS
+    if requested is None:
+        return default
+    return max(1, min(requested, MAX_TOKENS_CAP))
+
+
+def ends_sentence(text: str) -> bool:
+    return bool(SENTENCE_CLOSE.search(text.rstrip()))
+
+
+def truncate_to_sentence(text: str) -> str:
+    """Drop a trailing incomplete sentence; text without any complete sentence is kept as is."""
+    sentences = split_sentences(text)
+    if len(sentences) < 2 or ends_sentence(sentences[-1]):
+        return text.strip()
+    # Cut the original text after the last complete sentence, keeping its spacing
+    end = 0
+    for sentence in sentences[:-1]:
+        end = text.index(sentence, end) + len(sentence)
+    return text[:end].strip()
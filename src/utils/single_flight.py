@@ -0,0 +1,58 @@
+'''
+Single-flight coalescing of identical concurrent calls.
+
+While a call for a key is in flight, further callers with the same key wait on
+that call instead of starting their own, and every waiter gets its result or
+its exception. The shared call is cancelled only when all of its waiters are.
+'''
+
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from src.utils.metrics import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        # key -> (shared task, number of waiters)
+        self._calls: Dict[str, list] = {}
+        self.coalesced = metrics.counter(
+            f"single_flight_{name}_coalesced", f"{name} calls that joined an identical in-flight call"
+        )
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(call())
+            entry = [task, 0]
+            self._calls[key] = entry
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.coalesced.inc()
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield: one waiter going away must not cancel the call for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _forget(self, key: str, task: asyncio.Future):
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
+        # Retrieve the exception so a call nobody is waiting on any more
+        # doesn't log "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
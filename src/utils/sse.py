@@ -0,0 +1,17 @@
+'''
+Helpers for Server-Sent Events responses.
+'''
+
+import json
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    # Stop nginx-style proxies from buffering the stream
+    "X-Accel-Buffering": "no"
+}
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one SSE message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,185 @@
+'''
+Real-time speech recognition for audio streamed while the user speaks.
+
+A recognizer session takes 16-bit mono PCM as it arrives and yields partial and
+final transcripts before the user has finished talking, so transcription
+overlaps speech instead of starting after it. The "assemblyai" backend relays
+audio to AssemblyAI's streaming API over a WebSocket on the shared STT client;
+the "local" backend is a network-free stand-in for tests and load runs that
+only reports how much audio it received.
+'''
+
+import abc
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Optional
+
+import aiohttp
+
+from src.utils import stt_service
+from src.utils.metrics import metrics
+
+STREAM_BACKEND = os.getenv("STT_STREAM_BACKEND", "assemblyai")
+STREAMING_URL = os.getenv("ASSEMBLYAI_STREAMING_URL", "wss://streaming.assemblyai.com/v3/ws")
+
+BYTES_PER_SAMPLE = 2
+# AssemblyAI accepts 50-1000 ms of audio per message; client frames are often 20 ms
+MIN_CHUNK_MS = 50
+MAX_CHUNK_MS = 1000
+
+active_sessions = metrics.gauge("stt_stream_active_sessions", "Open streaming recognition sessions")
+sessions_started = metrics.counter("stt_stream_sessions", "Streaming recognition sessions started")
+session_errors = metrics.counter("stt_stream_errors", "Streaming recognition sessions that failed")
+finalize_ms = metrics.histogram(
+    "stt_stream_finalize_ms", [50, 100, 250, 500, 1000, 2500, 5000], "End of audio to final transcript"
+)
+
+
+class StreamingSTTError(Exception):
+    """Raised when the streaming recognizer backend fails."""
+
+
+class RecognizerSession(abc.ABC):
+    """
+    One utterance stream. Call start(), then send_audio() as PCM arrives and
+    finish() when the user stops; events() yields {"type": "partial" | "final",
+    "text": ...} until the backend has delivered everything.
+    """
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+
+    async def start(self):
+        pass
+
+    @abc.abstractmethod
+    async def send_audio(self, pcm: bytes):
+        """Queue PCM for recognition."""
+
+    @abc.abstractmethod
+    async def finish(self):
+        """Signal the end of audio; results keep arriving until events() ends."""
+
+    @abc.abstractmethod
+    def events(self) -> AsyncIterator[dict]:
+        """Partial and final transcripts until the backend is done."""
+
+    async def close(self):
+        pass
+
+    def _chunk_bytes(self, ms: int) -> int:
+        return self.sample_rate * BYTES_PER_SAMPLE * ms // 1000
+
+
+class AssemblyAIRecognizer(RecognizerSession):
+    def __init__(self, sample_rate: int):
+        super().__init__(sample_rate)
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._buffer = bytearray()
+
+    async def start(self):
+        self._ws = await stt_service.get_session().ws_connect(
+            STREAMING_URL,
+            params={"sample_rate": str(self.sample_rate), "encoding": "pcm_s16le", "format_turns": "true"},
+            heartbeat=20
+        )
+
+    async def send_audio(self, pcm: bytes):
+        self._buffer.extend(pcm)
+        max_bytes = self._chunk_bytes(MAX_CHUNK_MS)
+        while len(self._buffer) >= self._chunk_bytes(MIN_CHUNK_MS):
+            chunk = bytes(self._buffer[:max_bytes])
+            del self._buffer[:max_bytes]
+            await self._ws.send_bytes(chunk)
+
+    async def finish(self):
+        if self._buffer:
+            # Pad the tail up to the minimum message length with silence
+            tail = bytes(self._buffer).ljust(self._chunk_bytes(MIN_CHUNK_MS), b"\0")
+            self._buffer.clear()
+            await self._ws.send_bytes(tail)
+        await self._ws.send_str(json.dumps({"type": "Terminate"}))
+
+    async def events(self) -> AsyncIterator[dict]:
+        async for message in self._ws:
+            if message.type == aiohttp.WSMsgType.ERROR:
+                raise StreamingSTTError(f"AssemblyAI stream failed: {self._ws.exception()}")
+            if message.type != aiohttp.WSMsgType.TEXT:
+                continue
+
+            data = json.loads(message.data)
+            message_type = data.get("type")
+            if message_type == "Termination":
+                return
+            if message_type == "Error" or "error" in data:
+                raise StreamingSTTError(f"AssemblyAI stream error: {data.get('error', data)}")
+            if message_type != "Turn":
+                continue
+
+            # With format_turns a finished turn arrives twice: raw, then formatted
+            if not data.get("end_of_turn"):
+                yield {"type": "partial", "text": data.get("transcript", "")}
+            elif data.get("turn_is_formatted"):
+                yield {"type": "final", "text": data.get("transcript", "")}
+
+        # Closed without a Termination message
+        if self._ws.close_code not in (None, aiohttp.WSCloseCode.OK):
+            raise StreamingSTTError(f"AssemblyAI stream closed with code {self._ws.close_code}")
+
+    async def close(self):
+        if self._ws is not None and not self._ws.closed:
+            await self._ws.close()
+
+
+class LocalRecognizer(RecognizerSession):
+    """Stand-in backend: a partial every `partial_seconds` of audio, a final on finish."""
+
+    def __init__(self, sample_rate: int, partial_seconds: float = 0.5):
+        super().__init__(sample_rate)
+        self.partial_seconds = partial_seconds
+        self._received = 0
+        self._partials = 0
+        self._events: asyncio.Queue = asyncio.Queue()
+
+    def _describe(self) -> str:
+        return f"[{self._received / (self.sample_rate * BYTES_PER_SAMPLE):.1f}s of audio]"
+
+    async def send_audio(self, pcm: bytes):
+        self._received += len(pcm)
+        seconds = self._received / (self.sample_rate * BYTES_PER_SAMPLE)
+        if seconds >= (self._partials + 1) * self.partial_seconds:
+            self._partials = int(seconds / self.partial_seconds)
+            self._events.put_nowait({"type": "partial", "text": self._describe()})
+
+    async def finish(self):
+        self._events.put_nowait({"type": "final", "text": self._describe()})
+        self._events.put_nowait(None)
+
+    async def events(self) -> AsyncIterator[dict]:
+        while True:
+            event = await self._events.get()
+            if event is None:
+                return
+            yield event
+
+
+def is_configured() -> bool:
+    if STREAM_BACKEND == "local":
+        return True
+    return STREAM_BACKEND == "assemblyai" and bool(stt_service.API_KEY)
+
+
+def create_recognizer(sample_rate: int) -> RecognizerSession:
+    if STREAM_BACKEND == "local":
+        return LocalRecognizer(sample_rate)
+    return AssemblyAIRecognizer(sample_rate)
+
+
+def get_stats() -> dict:
+    return {
+        "backend": STREAM_BACKEND,
+        "active_sessions": active_sessions.value,
+        "sessions": sessions_started.value,
+        "errors": session_errors.value
+    }
@@ -1,12 +1,122 @@
 import os
 import aiohttp
-import asyncio
-from typing import Optional
+from typing import AsyncIterable, Optional, Union
 from dotenv import load_dotenv
 
+from src.utils.metrics import metrics
+from src.utils.transcript_poller import TranscriptPoller
+
 load_dotenv()
 
 API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+API_BASE_URL = "https://api.assemblyai.com/v2"
+
+# One keep-alive pool for every AssemblyAI call, so a transcription reuses
+# warm connections instead of paying a TCP+TLS handshake per request
+HTTP_MAX_CONNECTIONS = int(os.getenv("STT_HTTP_MAX_CONNECTIONS", "32"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("STT_HTTP_MAX_CONNECTIONS_PER_HOST", "16"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("STT_HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP_DNS_CACHE_SECONDS = int(os.getenv("STT_HTTP_DNS_CACHE_SECONDS", "300"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("STT_HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("STT_HTTP_TIMEOUT_SECONDS", "60"))
+
+# Completion is signalled by the AssemblyAI webhook when ASSEMBLYAI_WEBHOOK_URL
+# is set; the shared poller is the fallback either way (the webhook may land
+# on another worker, or never arrive)
+WEBHOOK_URL = os.getenv("ASSEMBLYAI_WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("ASSEMBLYAI_WEBHOOK_SECRET")
+WEBHOOK_AUTH_HEADER = "X-Webhook-Secret"
+
+POLL_INTERVAL_SECONDS = float(os.getenv("STT_POLL_INTERVAL_SECONDS", "0.25"))
+POLL_MAX_DELAY_SECONDS = float(os.getenv("STT_POLL_MAX_DELAY_SECONDS", "3"))
+POLL_MAX_CONCURRENCY = int(os.getenv("STT_POLL_MAX_CONCURRENCY", "8"))
+POLL_MAX_PER_TICK = int(os.getenv("STT_POLL_MAX_PER_TICK", "20"))
+TRANSCRIPTION_TIMEOUT_SECONDS = float(os.getenv("STT_TRANSCRIPTION_TIMEOUT_SECONDS", "120"))
+
+connections_created = metrics.counter("stt_http_connections_created", "New TCP/TLS connections to AssemblyAI")
+connections_reused = metrics.counter("stt_http_connections_reused", "AssemblyAI requests served on a pooled connection")
+connections_queued = metrics.counter("stt_http_connections_queued", "AssemblyAI requests that waited for a free connection")
+
+webhook_completions = metrics.counter("stt_webhook_completions", "Transcripts whose completion arrived by webhook")
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_create(session, context, params):
+        connections_created.inc()
+
+    async def on_reuse(session, context, params):
+        connections_reused.inc()
+
+    async def on_queued(session, context, params):
+        connections_queued.inc()
+
+    trace_config.on_connection_create_end.append(on_create)
+    trace_config.on_connection_reuseconn.append(on_reuse)
+    trace_config.on_connection_queued_start.append(on_queued)
+    return trace_config
+
+
+def get_session() -> aiohttp.ClientSession:
+    """The shared AssemblyAI client; created on first use if startup() has not run."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_MAX_CONNECTIONS,
+            limit_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=HTTP_DNS_CACHE_SECONDS
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            headers={"authorization": API_KEY or ""},
+            trace_configs=[_trace_config()]
+        )
+    return _session
+
+
+def notify_completion(transcript_id: str, status: str) -> bool:
+    """Wake the request waiting on a transcript; returns whether one was waiting."""
+    waiting = poller.notify(transcript_id, status, max_age=TRANSCRIPTION_TIMEOUT_SECONDS)
+    if waiting:
+        webhook_completions.inc()
+    return waiting
+
+
+async def startup():
+    get_session()
+
+
+async def shutdown():
+    global _session
+    await poller.close()
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def get_stats() -> dict:
+    stats = {
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_connections_per_host": HTTP_MAX_CONNECTIONS_PER_HOST,
+        "connections_created": connections_created.value,
+        "connections_reused": connections_reused.value,
+        "connections_queued": connections_queued.value,
+        "open": _session is not None and not _session.closed,
+        "webhook": bool(WEBHOOK_URL),
+        "webhook_completions": webhook_completions.value,
+        "poller": poller.get_stats()
+    }
+    if stats["open"]:
+        connector = _session.connector
+        # aiohttp has no public pool introspection; these are its bookkeeping sets
+        stats["in_use"] = len(getattr(connector, "_acquired", ()))
+        stats["idle"] = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+    return stats
 
 
 def is_configured() -> bool:
@@ -17,52 +127,62 @@ def is_configured() -> bool:
     return bool(API_KEY)
 
 
-async def upload_audio(audio_data: bytes) -> Optional[str]:
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            "https://api.assemblyai.com/v2/upload",
-            headers={"authorization": API_KEY},
-            data=audio_data
-        ) as response:
-            if response.status == 200:
-                result = await response.json()
-                return result.get("upload_url")
-            return None
+async def upload_audio(audio_data: Union[bytes, AsyncIterable[bytes]]) -> Optional[str]:
+    # Chunk iterables are sent with chunked transfer encoding as they arrive
+    async with get_session().post(
+        f"{API_BASE_URL}/upload",
+        data=audio_data
+    ) as response:
+        if response.status == 200:
+            result = await response.json()
+            return result.get("upload_url")
+        return None
 
 async def submit_transcription(upload_url: str) -> Optional[str]:
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            "https://api.assemblyai.com/v2/transcript",
-            headers={"authorization": API_KEY},
-            json={"audio_url": upload_url}
-        ) as response:
-            if response.status == 200:
-                result = await response.json()
-                return result.get("id")
-            return None
+    payload = {"audio_url": upload_url}
+    if WEBHOOK_URL:
+        payload["webhook_url"] = WEBHOOK_URL
+        if WEBHOOK_SECRET:
+            payload["webhook_auth_header_name"] = WEBHOOK_AUTH_HEADER
+            payload["webhook_auth_header_value"] = WEBHOOK_SECRET
+    
+    async with get_session().post(
+        f"{API_BASE_URL}/transcript",
+        json=payload
+    ) as response:
+        if response.status == 200:
+            result = await response.json()
+            return result.get("id")
+        return None
+
+async def fetch_transcript(transcript_id: str) -> Optional[dict]:
+    async with get_session().get(
+        f"{API_BASE_URL}/transcript/{transcript_id}"
+    ) as response:
+        if response.status == 200:
+            return await response.json()
+        return None
+
+# One background task polls every pending transcript on a shared tick
+poller = TranscriptPoller(
+    fetch_transcript,
+    interval=POLL_INTERVAL_SECONDS,
+    max_delay=POLL_MAX_DELAY_SECONDS,
+    max_concurrency=POLL_MAX_CONCURRENCY,
+    max_polls_per_tick=POLL_MAX_PER_TICK
+)
+
+async def poll_result(transcript_id: str, timeout: float = TRANSCRIPTION_TIMEOUT_SECONDS) -> Optional[str]:
+    result = await poller.wait(transcript_id, timeout)
+    if result is None:
+        return None
+    
+    if result.get("status") == "error":
+        print(f"Transcription error: {result.get('error')}")
+        return None
+    return result.get("text")
 
-async def poll_result(transcript_id: str) -> Optional[str]:
-    async with aiohttp.ClientSession() as session:
-        while True:
-            async with session.get(
-                f"https://api.assemblyai.com/v2/transcript/{transcript_id}",
-                headers={"authorization": API_KEY}
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    status = result.get("status")
-                    
-                    if status == "completed":
-                        return result.get("text")
-                    elif status == "error":
-                        print(f"Transcription error: {result.get('error')}")
-                        return None
-                    
-                    await asyncio.sleep(1)
-                else:
-                    return None
-
-async def transcribe_audio(audio_data: bytes) -> Optional[str]:
+async def transcribe_audio(audio_data: Union[bytes, AsyncIterable[bytes]]) -> Optional[str]:
     try:
         upload_url = await upload_audio(audio_data)
         if not upload_url:
@@ -0,0 +1,92 @@
+'''
+Sentence segmentation for spoken replies (English and Mexican Spanish).
+'''
+
+import re
+from typing import Iterator, List, Tuple
+
+# Abbreviations that end in a period but don't end a sentence
+ABBREVIATIONS = {
+    "sr", "sra", "srta", "dr", "dra", "lic", "ing", "prof", "ud", "uds", "etc",
+    "mr", "mrs", "ms", "st", "jr", "vs", "approx", "núm", "p.ej", "e.g", "i.e"
+}
+
+# "No." abbreviates a number only when one follows ("No. 5"); otherwise it is
+# the word "no" ending a sentence ("Creo que no.")
+NUMBER_SIGN = re.compile(r"\bno\.$", re.IGNORECASE)
+
+# Terminal punctuation, optionally followed by closing quotes/brackets. A
+# Spanish ¿ or ¡ also opens a new sentence when the space before it is missing.
+SENTENCE_END = re.compile(r"([.!?…]+|\.\.\.)([\"'”’»)\]]*)(\s+|$|(?=[¿¡]))")
+
+
+def _ends_with_abbreviation(text: str) -> bool:
+    match = re.search(r"([\w.]+)\.$", text)
+    if not match:
+        return False
+    word = match.group(1).lower()
+    # Initials are single letters; "Son las 3." still ends a sentence
+    return word in ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+
+def _sentences(text: str, final: bool) -> Iterator[Tuple[str, int]]:
+    """Yield (sentence, end offset) for each complete sentence in text."""
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        # Punctuation at the very end of a partial text may still be followed
+        # by more (e.g. "..." or a closing quote) or turn out to be "Dr."
+        if not final and not match.group(3) and match.end() == len(text):
+            break
+        end = match.end(2)
+        candidate = text[start:end].strip()
+        if not candidate:
+            continue
+        # "Dr. García" or an initial like "J. López" is not a sentence boundary
+        if match.group(1) == "." and _ends_with_abbreviation(candidate):
+            continue
+        if match.group(1) == "." and NUMBER_SIGN.search(candidate):
+            following = text[match.end():]
+            # Whether a number follows isn't known until more text arrives
+            if not final and not following:
+                break
+            if following[:1].isdigit():
+                continue
+        yield candidate, match.end()
+        start = match.end()
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, keeping punctuation and Spanish ¿¡ openers intact."""
+    sentences = []
+    start = 0
+    for sentence, start in _sentences(text, final=True):
+        sentences.append(sentence)
+
+    remainder = text[start:].strip()
+    if remainder:
+        sentences.append(remainder)
+    return sentences
+
+
+class SentenceStream:
+    """
+    Incremental splitter for streamed text: feed() returns the sentences
+    completed by the new chunk, flush() returns whatever is left at the end.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        self._buffer += chunk
+        sentences = []
+        consumed = 0
+        for sentence, consumed in _sentences(self._buffer, final=False):
+            sentences.append(sentence)
+        self._buffer = self._buffer[consumed:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        sentences = split_sentences(self._buffer)
+        self._buffer = ""
+        return sentences
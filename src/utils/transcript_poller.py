@@ -0,0 +1,184 @@
+'''
+Centralized polling of pending AssemblyAI transcripts.
+
+Instead of every transcription running its own poll loop, waiting requests
+register their transcript id here and one background task polls all of them on
+a shared tick. Each transcript backs off exponentially between polls, at most
+`max_polls_per_tick` status requests go out per tick and at most
+`max_concurrency` at once, so upstream request volume is set by the cadence
+rather than by the number of concurrent users. A completion webhook moves a
+transcript to the front of the next tick.
+'''
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.utils.metrics import metrics
+
+FINAL_STATUSES = ("completed", "error")
+
+
+class PendingTranscript:
+    def __init__(self, future: asyncio.Future, next_poll_at: float, delay: float):
+        self.future = future
+        self.registered_at = time.monotonic()
+        self.next_poll_at = next_poll_at
+        self.delay = delay
+        self.polling = False
+
+
+class TranscriptPoller:
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Optional[dict]]],
+        interval: float = 0.25,
+        max_delay: float = 3.0,
+        max_concurrency: int = 8,
+        max_polls_per_tick: int = 20
+    ):
+        # fetch(transcript_id) returns the transcript JSON, or None on an HTTP error
+        self.fetch = fetch
+        self.interval = interval
+        self.max_delay = max_delay
+        self.max_polls_per_tick = max_polls_per_tick
+
+        self._pending: Dict[str, PendingTranscript] = {}
+        # Completion webhooks that arrived before anyone waited on the transcript
+        self._early: "OrderedDict[str, float]" = OrderedDict()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.polls = metrics.counter("stt_poller_polls", "Transcript status polls sent by the poller")
+        self.ticks = metrics.counter("stt_poller_ticks", "Poller ticks that sent at least one poll")
+        self.timeouts = metrics.counter("stt_poller_timeouts", "Transcripts abandoned at the deadline")
+        self.pending_gauge = metrics.gauge("stt_poller_pending", "Transcripts waiting for completion")
+        self.oldest_gauge = metrics.gauge("stt_poller_oldest_seconds", "Age of the oldest pending transcript")
+        self.wait_seconds = metrics.histogram(
+            "stt_poller_wait_seconds", [0.5, 1, 2, 5, 10, 30, 60, 120], "Time from registration to a final status"
+        )
+
+    async def wait(self, transcript_id: str, timeout: float) -> Optional[dict]:
+        """The final transcript JSON, or None on an HTTP error or at the deadline."""
+        entry = self._pending.get(transcript_id)
+        if entry is None:
+            now = time.monotonic()
+            signalled = self._early.pop(transcript_id, None) is not None
+            entry = PendingTranscript(
+                asyncio.get_running_loop().create_future(),
+                next_poll_at=now if signalled else now + self.interval,
+                delay=self.interval
+            )
+            self._pending[transcript_id] = entry
+            self._update_gauges()
+            if signalled:
+                self._wakeup.set()
+        self._ensure_running()
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(entry.future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts.inc()
+            print(f"Transcript {transcript_id} not finished after {timeout:g}s, giving up")
+            return None
+        finally:
+            if self._pending.get(transcript_id) is entry:
+                del self._pending[transcript_id]
+                self._update_gauges()
+
+    def notify(self, transcript_id: str, status: str, max_age: float = 300) -> bool:
+        """Poll a transcript on the next tick; returns whether a request was waiting on it."""
+        if status not in FINAL_STATUSES:
+            return False
+        entry = self._pending.get(transcript_id)
+        if entry is None:
+            # Possibly submitted by another worker; forget it after max_age
+            cutoff = time.monotonic() - max_age
+            while self._early and next(iter(self._early.values())) < cutoff:
+                self._early.popitem(last=False)
+            self._early[transcript_id] = time.monotonic()
+            return False
+        entry.next_poll_at = 0
+        self._wakeup.set()
+        return True
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._pending:
+            now = time.monotonic()
+            due = sorted(
+                (
+                    (entry.next_poll_at, transcript_id)
+                    for transcript_id, entry in self._pending.items()
+                    if entry.next_poll_at <= now and not entry.polling
+                ),
+                key=lambda item: item[0]
+            )[:self.max_polls_per_tick]
+            if due:
+                self.ticks.inc()
+                await asyncio.gather(*(self._poll(transcript_id) for _, transcript_id in due))
+            self._update_gauges()
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, transcript_id: str):
+        entry = self._pending.get(transcript_id)
+        if entry is None:
+            return
+        entry.polling = True
+        try:
+            async with self._slots:
+                self.polls.inc()
+                result = await self.fetch(transcript_id)
+        except Exception as e:
+            if not entry.future.done():
+                entry.future.set_exception(e)
+            return
+        finally:
+            entry.polling = False
+
+        if entry.future.done():
+            return
+        if result is None or result.get("status") in FINAL_STATUSES:
+            self.wait_seconds.observe(time.monotonic() - entry.registered_at)
+            entry.future.set_result(result)
+            return
+        entry.delay = min(entry.delay * 2, self.max_delay)
+        entry.next_poll_at = time.monotonic() + entry.delay
+
+    def _update_gauges(self):
+        self.pending_gauge.set(len(self._pending))
+        self.oldest_gauge.set(round(self._oldest_age(), 3))
+
+    def _oldest_age(self) -> float:
+        if not self._pending:
+            return 0.0
+        return time.monotonic() - min(entry.registered_at for entry in self._pending.values())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for entry in self._pending.values():
+            if not entry.future.done():
+                entry.future.cancel()
+
+    def get_stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "oldest_pending_seconds": round(self._oldest_age(), 3),
+            "interval_seconds": self.interval,
+            "max_polls_per_tick": self.max_polls_per_tick,
+            "polls": self.polls.value,
+            "ticks": self.ticks.value,
+            "timeouts": self.timeouts.value
+        }
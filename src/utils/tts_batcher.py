@@ -0,0 +1,121 @@
+'''
+Dynamic micro-batching for the in-process ONNX voice.
+
+Sentences from concurrent requests are queued and collected for a short window
+(or until the batch is full), synthesized with one padded ONNX inference, and
+the audio is handed back to each caller. While a batch is running new requests
+keep queueing, so batches grow naturally under load.
+'''
+
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+
+from src.utils.metrics import metrics
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+QUEUE_WAIT_MS_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500]
+
+
+class TTSBatchScheduler:
+    def __init__(
+        self,
+        infer_batch: Callable[[List[List[int]]], List[bytes]],
+        window_ms: float = 10.0,
+        max_batch_size: int = 8
+    ):
+        # infer_batch is blocking and runs in the default executor
+        self.infer_batch = infer_batch
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._item_added: Optional[asyncio.Event] = None
+        self._dispatch_task: Optional[asyncio.Task] = None
+
+        self.batch_size_histogram = metrics.histogram(
+            "tts_batch_size", BATCH_SIZE_BUCKETS, "Sentences per batched ONNX inference"
+        )
+        self.queue_wait_histogram = metrics.histogram(
+            "tts_batch_queue_wait_ms", QUEUE_WAIT_MS_BUCKETS, "Time a sentence waited before inference"
+        )
+        self.queue_depth = metrics.gauge("tts_batch_queue_depth", "Sentences waiting to be batched")
+
+    def start(self):
+        if self._dispatch_task is None:
+            self._queue = asyncio.Queue()
+            self._item_added = asyncio.Event()
+            self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+
+    async def close(self):
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+            try:
+                await self._dispatch_task
+            except asyncio.CancelledError:
+                pass
+            self._dispatch_task = None
+        if self._queue:
+            while not self._queue.empty():
+                _, future, _ = self._queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("TTS batch scheduler stopped"))
+
+    async def submit(self, phoneme_ids: List[int]) -> bytes:
+        """Queue one sentence and wait for its PCM audio."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((phoneme_ids, future, time.monotonic()))
+        self._item_added.set()
+        self.queue_depth.set(self._queue.qsize())
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[List[int], asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.window
+
+        while True:
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.max_batch_size or remaining <= 0:
+                return batch
+
+            # Waiting on an event rather than queue.get() means a timeout can
+            # never swallow an item that arrived at the same moment.
+            self._item_added.clear()
+            try:
+                await asyncio.wait_for(self._item_added.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            self.queue_depth.set(self._queue.qsize())
+
+            # Callers that gave up while queued don't need synthesizing
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            for _, _, enqueued_at in batch:
+                self.queue_wait_histogram.observe((started - enqueued_at) * 1000)
+            self.batch_size_histogram.observe(len(batch))
+
+            try:
+                results = await loop.run_in_executor(
+                    None, self.infer_batch, [phoneme_ids for phoneme_ids, _, _ in batch]
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), pcm in zip(batch, results):
+                if not future.done():
+                    future.set_result(pcm)
@@ -0,0 +1,190 @@
+'''
+Content-addressed cache for synthesized audio.
+
+Entries are keyed by a hash of the normalized text, voice model, output format
+and synthesis parameters. A small in-memory LRU holds hot entries and a
+size-bounded directory on disk holds the rest; both tiers evict least recently
+used entries once their byte budget is exceeded.
+'''
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from src.utils.metrics import metrics
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class TTSAudioCache:
+    def __init__(self, cache_dir: Path, memory_max_bytes: int, disk_max_bytes: int):
+        self.cache_dir = cache_dir
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # key -> (path, size), least recently used first
+        self._disk: "OrderedDict[str, Tuple[Path, int]]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = metrics.counter("tts_cache_memory_hits", "TTS cache hits served from memory")
+        self.disk_hits = metrics.counter("tts_cache_disk_hits", "TTS cache hits served from disk")
+        self.misses = metrics.counter("tts_cache_misses", "TTS cache misses")
+        self.evictions = metrics.counter("tts_cache_evictions", "TTS cache entries evicted from either tier")
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._load_disk_index()
+
+    @staticmethod
+    def make_key(text: str, voice: str, output_format: str, params: dict) -> str:
+        payload = json.dumps(
+            {
+                "text": normalize_text(text),
+                "voice": voice,
+                "format": output_format,
+                "params": params
+            },
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load_disk_index(self):
+        entries = []
+        for file_path in self.cache_dir.glob("*.*"):
+            if file_path.suffix == ".part":
+                # Left behind by an interrupted write
+                file_path.unlink(missing_ok=True)
+                continue
+            if file_path.is_file():
+                stat = file_path.stat()
+                entries.append((stat.st_mtime, file_path.stem, file_path, stat.st_size))
+        for _, key, file_path, size in sorted(entries):
+            self._disk[key] = (file_path, size)
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_max_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_max_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+                self.evictions.inc()
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_max_bytes and self._disk:
+            _, (file_path, size) = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.evictions.inc()
+            try:
+                file_path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def disk_path(self, key: str) -> Optional[Path]:
+        with self._lock:
+            entry = self._disk.get(key)
+        return entry[0] if entry else None
+
+    def find_file(self, filename: str) -> Optional[Tuple[Path, int]]:
+        """(path, size) of a disk-tier entry by its file name, or None."""
+        key = Path(filename).stem
+        with self._lock:
+            entry = self._disk.get(key)
+        if entry is None or entry[0].name != filename:
+            return None
+        return entry
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._disk.get(key)
+            if not entry:
+                return None
+            self._disk.move_to_end(key)
+        file_path = entry[0]
+        try:
+            data = file_path.read_bytes()
+            os.utime(file_path)
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                if self._disk.pop(key, None):
+                    self._disk_bytes -= entry[1]
+            return None
+
+    def _write_disk(self, key: str, data: bytes, output_format: str):
+        if len(data) > self.disk_max_bytes:
+            return
+        file_path = self.cache_dir / f"{key}.{output_format}"
+        # Write then rename so readers never see a partial file
+        tmp_path = file_path.with_suffix(file_path.suffix + ".part")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, file_path)
+        with self._lock:
+            previous = self._disk.pop(key, None)
+            if previous:
+                self._disk_bytes -= previous[1]
+            self._disk[key] = (file_path, len(data))
+            self._disk_bytes += len(data)
+            self._evict_disk()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+        if data is not None:
+            self.memory_hits.inc()
+            return data
+
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self._read_disk, key)
+        if data is not None:
+            self.disk_hits.inc()
+            self._remember(key, data)
+            return data
+
+        self.misses.inc()
+        return None
+
+    async def put(self, key: str, data: bytes, output_format: str):
+        self._remember(key, data)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._write_disk, key, data, output_format)
+        except OSError as e:
+            print(f"Could not write TTS cache entry {key}: {str(e)}")
+
+    def get_stats(self) -> dict:
+        hits = self.memory_hits.value + self.disk_hits.value
+        lookups = hits + self.misses.value
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_max_bytes": self.memory_max_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+            "memory_hits": self.memory_hits.value,
+            "disk_hits": self.disk_hits.value,
+            "misses": self.misses.value,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,76 @@
+'''
+Bounded streaming of uploaded audio.
+
+Uploads are forwarded to the STT provider chunk by chunk instead of being read
+into memory whole, so memory per request stays at about one chunk however long
+the recording is. The size limit is enforced while the bytes stream past.
+'''
+
+import os
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, Request, UploadFile
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("STT_MAX_UPLOAD_MB", "25")) * 1024 * 1024)
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class AudioUpload:
+    """
+    Async iterable over the upload's chunks, usable as an aiohttp request body.
+    Stops with `too_large` set once more than `max_bytes` have streamed past.
+    """
+
+    def __init__(self, first_chunk: bytes, rest: AsyncIterator[bytes], max_bytes: int):
+        self._first_chunk = first_chunk
+        self._rest = rest
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.too_large = False
+
+    async def __aiter__(self):
+        yield self._count(self._first_chunk)
+        async for chunk in self._rest:
+            yield self._count(chunk)
+
+    def _count(self, chunk: bytes) -> bytes:
+        self.received += len(chunk)
+        if self.received > self.max_bytes:
+            # Aborts the outbound upload; callers check too_large
+            self.too_large = True
+            raise HTTPException(status_code=413, detail=too_large_detail(self.max_bytes))
+        return chunk
+
+
+def too_large_detail(max_bytes: int) -> str:
+    return f"Audio file too large. Maximum size: {max_bytes / (1024 * 1024):g} MB"
+
+
+async def upload_file_chunks(upload: UploadFile, chunk_size: int = UPLOAD_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def open_upload(chunks: AsyncIterator[bytes], max_bytes: int = MAX_UPLOAD_BYTES) -> AudioUpload:
+    """Wait for the first bytes so an empty upload is rejected before anything is sent upstream."""
+    async for chunk in chunks:
+        if chunk:
+            return AudioUpload(chunk, chunks, max_bytes)
+    raise HTTPException(status_code=400, detail="Empty audio file")
+
+
+async def open_file_upload(upload: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> AudioUpload:
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail=too_large_detail(max_bytes))
+    return await open_upload(upload_file_chunks(upload), max_bytes)
+
+
+async def open_body_upload(request: Request, max_bytes: int = MAX_UPLOAD_BYTES) -> AudioUpload:
+    """Stream a raw request body (Content-Type audio/*) as it arrives from the client."""
+    content_length: Optional[str] = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=too_large_detail(max_bytes))
+    return await open_upload(request.stream(), max_bytes)
@@ -0,0 +1,67 @@
+'''
+Pipelined reply generation: Gemini streams the reply and each sentence is
+synthesized as soon as it is complete, so LLM and TTS time overlap instead of
+adding up.
+'''
+
+import json
+from typing import Optional, Tuple
+
+from src.utils.gemini_service import FALLBACK_REPLY, UNAVAILABLE_REPLY, LLMUnavailableError, gemini_service
+from src.utils.piper_service import piper_tts_service
+from src.utils.response_budget import VOICE_MAX_TOKENS
+from src.utils.single_flight import SingleFlight
+
+_flights = SingleFlight("spoken_reply")
+
+
+async def generate_spoken_reply(
+    prompt: str,
+    voice_format: str,
+    encode_base64: bool = True,
+    use_cache: bool = True,
+    context: str = "",
+    max_tokens: int = VOICE_MAX_TOKENS
+) -> Tuple[str, Optional[dict]]:
+    """
+    Return the reply text and its text_to_speech-style voice result (None when
+    synthesis failed). While Gemini's circuit is open the canned unavailable
+    reply is spoken instead; other LLM errors are raised as by generate_text.
+    Identical requests already in flight share one generation and synthesis.
+    """
+    key = json.dumps([prompt, voice_format, encode_base64, use_cache, context, max_tokens], ensure_ascii=False)
+    ai_response, voice_result = await _flights.do(
+        key, lambda: _generate_spoken_reply(prompt, voice_format, encode_base64, use_cache, context, max_tokens)
+    )
+    return ai_response, dict(voice_result) if voice_result else voice_result
+
+
+async def _generate_spoken_reply(
+    prompt: str,
+    voice_format: str,
+    encode_base64: bool,
+    use_cache: bool,
+    context: str,
+    max_tokens: int
+) -> Tuple[str, Optional[dict]]:
+    usage = {}
+    try:
+        ai_response, voice_result = await piper_tts_service.stream_to_speech(
+            gemini_service.stream_text(
+                prompt, max_tokens=max_tokens, usage=usage, use_cache=use_cache, context=context
+            ),
+            voice_format,
+            encode_base64=encode_base64,
+            drop_incomplete_tail=lambda: usage.get("truncated", False)
+        )
+    except LLMUnavailableError:
+        # Fail fast with the canned reply; its audio is in the phrase bank
+        ai_response = UNAVAILABLE_REPLY
+        voice_result = await piper_tts_service.text_to_speech(ai_response, voice_format, encode_base64=encode_base64)
+        return ai_response, voice_result
+    
+    if not ai_response:
+        ai_response = FALLBACK_REPLY
+        voice_result = await piper_tts_service.text_to_speech(ai_response, voice_format, encode_base64=encode_base64)
+    
+    return ai_response, voice_result
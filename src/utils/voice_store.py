@@ -0,0 +1,207 @@
+'''
+Index of generated voice files with a retention policy.
+
+The directory is scanned once at startup; after that every new file is
+registered as it is written, so listing never touches the filesystem. A
+background sweeper deletes files past the maximum age and, if the directory is
+still over its byte budget, the oldest files until it fits.
+'''
+
+import asyncio
+import base64
+import bisect
+import datetime
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.metrics import metrics
+
+VOICE_FILE_SUFFIXES = [".wav", ".opus", ".mp3", ".flac"]
+
+
+class VoiceFileStore:
+    def __init__(
+        self,
+        voice_dir: Path,
+        max_age_seconds: float,
+        max_total_bytes: int,
+        sweep_interval: float = 300.0
+    ):
+        self.voice_dir = voice_dir
+        self.max_age_seconds = max_age_seconds
+        self.max_total_bytes = max_total_bytes
+        self.sweep_interval = sweep_interval
+
+        # filename -> (created, size); _order holds (created, filename) ascending
+        self._files: Dict[str, Tuple[float, int]] = {}
+        self._order: List[Tuple[float, str]] = []
+        self._total_bytes = 0
+        self._sweep_task: Optional[asyncio.Task] = None
+
+        self.files_deleted = metrics.counter("voice_files_deleted", "Voice files removed by the retention sweeper")
+        self.files_gauge = metrics.gauge("voice_files", "Voice files currently on disk")
+        self.bytes_gauge = metrics.gauge("voice_files_bytes", "Bytes used by voice files on disk")
+
+        self._scan()
+
+    def _scan(self):
+        for file_path in self.voice_dir.glob("*"):
+            if file_path.is_file() and file_path.suffix in VOICE_FILE_SUFFIXES:
+                stat = file_path.stat()
+                self._add(file_path.name, stat.st_mtime, stat.st_size)
+
+    def _add(self, filename: str, created: float, size: int):
+        if filename in self._files:
+            self._discard(filename)
+        self._files[filename] = (created, size)
+        bisect.insort(self._order, (created, filename))
+        self._total_bytes += size
+        self._update_gauges()
+
+    def _discard(self, filename: str) -> Optional[Tuple[float, int]]:
+        entry = self._files.pop(filename, None)
+        if entry is None:
+            return None
+        created, size = entry
+        index = bisect.bisect_left(self._order, (created, filename))
+        if index < len(self._order) and self._order[index] == (created, filename):
+            del self._order[index]
+        self._total_bytes -= size
+        self._update_gauges()
+        return entry
+
+    def _update_gauges(self):
+        self.files_gauge.set(len(self._files))
+        self.bytes_gauge.set(self._total_bytes)
+
+    def register(self, file_path: Path, size: int):
+        """Record a voice file that was just written."""
+        self._add(file_path.name, time.time(), size)
+
+    def get_entry(self, filename: str) -> Optional[Tuple[Path, float, int]]:
+        """(path, created, size) for an indexed file, or None."""
+        entry = self._files.get(filename)
+        if entry is None:
+            return None
+        return (self.voice_dir / filename, *entry)
+
+    def forget(self, filename: str):
+        """Drop a file from the index, e.g. after it disappeared from disk."""
+        self._discard(filename)
+
+    @staticmethod
+    def etag(created: float, size: int) -> str:
+        # Voice files are never rewritten, so creation time and size identify the content
+        return f'"{size:x}-{int(created * 1000):x}"'
+
+    def get(self, filename: str) -> Optional[dict]:
+        entry = self._files.get(filename)
+        if entry is None:
+            return None
+        return self._describe(filename, *entry)
+
+    def _describe(self, filename: str, created: float, size: int) -> dict:
+        return {
+            "filename": filename,
+            "size": size,
+            "created": datetime.datetime.fromtimestamp(created).isoformat(),
+            "path": str(self.voice_dir / filename)
+        }
+
+    @staticmethod
+    def _encode_cursor(created: float, filename: str) -> str:
+        return base64.urlsafe_b64encode(f"{created!r}|{filename}".encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[float, str]:
+        try:
+            created, filename = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+            return float(created), filename
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError("Invalid cursor") from e
+
+    def list_files(self, limit: int = 50, cursor: Optional[str] = None) -> dict:
+        """Newest-first page of voice files; pass next_cursor back to continue."""
+        if cursor:
+            start = bisect.bisect_left(self._order, self._decode_cursor(cursor)) - 1
+        else:
+            start = len(self._order) - 1
+
+        stop = max(-1, start - limit)
+        page = [self._order[index] for index in range(start, stop, -1)]
+        voice_files = [self._describe(filename, *self._files[filename]) for _, filename in page]
+
+        next_cursor = None
+        if page and stop >= 0:
+            next_cursor = self._encode_cursor(*page[-1])
+
+        return {
+            "voice_files": voice_files,
+            "total_files": len(self._files),
+            "total_bytes": self._total_bytes,
+            "next_cursor": next_cursor
+        }
+
+    def start(self):
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def close(self):
+        if self._sweep_task:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+
+    async def _sweep_loop(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Voice file retention sweep failed: {str(e)}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def _expired(self) -> List[str]:
+        expired = []
+        cutoff = time.time() - self.max_age_seconds
+        total = self._total_bytes
+        # Oldest first: everything past the age limit, then enough to fit the budget
+        for created, filename in self._order:
+            if created < cutoff or total > self.max_total_bytes:
+                expired.append(filename)
+                total -= self._files[filename][1]
+            else:
+                break
+        return expired
+
+    async def sweep(self) -> int:
+        expired = self._expired()
+        if not expired:
+            return 0
+
+        for filename in expired:
+            self._discard(filename)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._delete_files, expired)
+        self.files_deleted.inc(len(expired))
+        return len(expired)
+
+    def _delete_files(self, filenames: List[str]):
+        for filename in filenames:
+            try:
+                (self.voice_dir / filename).unlink()
+            except FileNotFoundError:
+                pass
+
+    def get_stats(self) -> dict:
+        return {
+            "files": len(self._files),
+            "total_bytes": self._total_bytes,
+            "max_total_bytes": self.max_total_bytes,
+            "max_age_seconds": self.max_age_seconds,
+            "files_deleted": self.files_deleted.value
+        }
@@ -0,0 +1,23 @@
+'''
+Gemini reply cache keys.
+
+Run from the repository root with: python -m pytest -q tests
+'''
+
+from src.utils.llm_cache import LLMResponseCache
+
+
+def key(prompt: str) -> str:
+    return LLMResponseCache.make_key(prompt, "system", "model", {"max_output_tokens": 120})
+
+
+def test_questions_and_statements_get_different_keys():
+    assert key("¿Tomé mi medicina?") != key("Tomé mi medicina.")
+    assert key("Did I take my pills?") != key("Did I take my pills.")
+    assert key("¡Ya me tomé la pastilla!") != key("¿Ya me tomé la pastilla?")
+
+
+def test_case_spacing_and_trailing_period_are_ignored():
+    assert key("Hola Jessy") == key("  hola   JESSY. ")
+    assert key("Gracias.") == key("gracias")
+    assert key("¿Cómo estás?") == key("¿cómo  estás?")
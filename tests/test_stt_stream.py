@@ -0,0 +1,109 @@
+'''
+WebSocket tests for /stt/stream against the local recognizer backend.
+
+Run from the repository root with: python -m pytest -q tests
+'''
+
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from src.routes import stt
+from src.utils import streaming_stt
+
+SAMPLE_RATE = 16000
+FRAME_BYTES = SAMPLE_RATE * streaming_stt.BYTES_PER_SAMPLE // 50  # 20 ms
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(streaming_stt, "STREAM_BACKEND", "local")
+    app = FastAPI()
+    app.include_router(stt.router, prefix="/stt")
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def send_speech(ws, seconds: float):
+    for _ in range(int(seconds * 50)):
+        ws.send_bytes(b"\0" * FRAME_BYTES)
+
+
+def wait_for_idle_sessions(timeout: float = 2.0) -> float:
+    deadline = time.monotonic() + timeout
+    while streaming_stt.active_sessions.value and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return streaming_stt.active_sessions.value
+
+
+def test_recognizer_session_is_abstract():
+    with pytest.raises(TypeError):
+        streaming_stt.RecognizerSession(SAMPLE_RATE)
+
+
+def test_partials_final_and_done(client):
+    with client.websocket_connect(f"/stt/stream?sample_rate={SAMPLE_RATE}") as ws:
+        send_speech(ws, 1.2)
+        ws.send_json({"type": "end"})
+
+        messages = []
+        while True:
+            message = ws.receive_json()
+            messages.append(message)
+            if message["type"] in ("done", "error"):
+                break
+
+    assert messages == [
+        {"type": "partial", "text": "[0.5s of audio]"},
+        {"type": "partial", "text": "[1.0s of audio]"},
+        {"type": "final", "text": "[1.2s of audio]"},
+        {"type": "done", "text": "[1.2s of audio]"},
+    ]
+    assert wait_for_idle_sessions() == 0
+
+
+def test_client_disconnect_releases_session(client):
+    started = streaming_stt.sessions_started.value
+    errors = streaming_stt.session_errors.value
+
+    with client.websocket_connect(f"/stt/stream?sample_rate={SAMPLE_RATE}") as ws:
+        send_speech(ws, 0.6)
+        assert ws.receive_json() == {"type": "partial", "text": "[0.5s of audio]"}
+        # Leaving the block closes the socket without an end message
+
+    assert wait_for_idle_sessions() == 0
+    assert streaming_stt.sessions_started.value == started + 1
+    assert streaming_stt.session_errors.value == errors
+
+
+def test_unsupported_encoding(client):
+    with client.websocket_connect("/stt/stream?encoding=flac") as ws:
+        message = ws.receive_json()
+        assert message["type"] == "error"
+        assert "Unsupported encoding" in message["error"]
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1003
+
+
+def test_backend_failure_reports_error(client, monkeypatch):
+    class FailingRecognizer(streaming_stt.LocalRecognizer):
+        async def events(self):
+            raise streaming_stt.StreamingSTTError("backend went away")
+            yield
+
+    monkeypatch.setattr(streaming_stt, "create_recognizer", lambda sample_rate: FailingRecognizer(sample_rate))
+    errors = streaming_stt.session_errors.value
+
+    with client.websocket_connect(f"/stt/stream?sample_rate={SAMPLE_RATE}") as ws:
+        send_speech(ws, 0.1)
+        assert ws.receive_json() == {"type": "error", "error": "backend went away"}
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+
+    assert closed.value.code == 1011
+    assert streaming_stt.session_errors.value == errors + 1
+    assert wait_for_idle_sessions() == 0
@@ -0,0 +1,53 @@
+'''
+Sentence splitting for spoken replies.
+
+Run from the repository root with: python -m pytest -q tests
+'''
+
+from src.utils.response_budget import truncate_to_sentence
+from src.utils.text_segmentation import SentenceStream, split_sentences
+
+
+def stream(text: str, chunk_size: int = 3):
+    splitter = SentenceStream()
+    sentences = []
+    for start in range(0, len(text), chunk_size):
+        sentences += splitter.feed(text[start:start + chunk_size])
+    return sentences + splitter.flush()
+
+
+def test_no_ends_a_sentence():
+    assert split_sentences("Creo que no. ¿Quieres que llame a alguien?") == [
+        "Creo que no.",
+        "¿Quieres que llame a alguien?",
+    ]
+    assert split_sentences("No. Eso no es bueno.") == ["No.", "Eso no es bueno."]
+    assert split_sentences("I think not. No. Let's rest.") == ["I think not.", "No.", "Let's rest."]
+
+
+def test_no_before_a_number_is_an_abbreviation():
+    assert split_sentences("Vive en la calle No. 5 del centro. Llega pronto.") == [
+        "Vive en la calle No. 5 del centro.",
+        "Llega pronto.",
+    ]
+    assert split_sentences("Take pill no. 2 now.") == ["Take pill no. 2 now."]
+
+
+def test_streamed_no_waits_for_the_next_word():
+    assert stream("Creo que no. ¿Quieres que llame a alguien?") == [
+        "Creo que no.",
+        "¿Quieres que llame a alguien?",
+    ]
+    assert stream("La calle No. 5 está cerca. Sí.") == ["La calle No. 5 está cerca.", "Sí."]
+
+
+def test_truncation_keeps_a_sentence_ending_in_no():
+    assert truncate_to_sentence("Creo que no. Hoy vamos a") == "Creo que no."
+
+
+def test_numbers_and_initials():
+    assert split_sentences("Son las 3. Luego comemos.") == ["Son las 3.", "Luego comemos."]
+    assert split_sentences("Habló con J. López. El Dr. García llega.") == [
+        "Habló con J. López.",
+        "El Dr. García llega.",
+    ]